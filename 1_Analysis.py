@@ -1,10 +1,17 @@
 import streamlit as st
 import polars as pl
-import pandas as pd
-import numpy as np
-import datetime as dt
-import plotly.express as px
-# import geopandas as gp
+import pyarrow as pa
+import plotly.graph_objects as go
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import query_engine as qe
+from dataset import DATA_DIR, scan_national, read_national_summary, national_version
+from export import EXPORT_FORMATS, EXPORT_TABLES, export_bytes, export_filename
+from figure_bundles import load_bundle, submit_selection, collect_selection, complete_result
+from geometry import load_state_geometry, constituency_map_frame
+from instrumentation import start_trace, end_trace, span
+from result_cache import DiskCache, ResultCache, selection_key
 
 
 # from: https://youtu.be/lWxN-n6L7Zc
@@ -21,6 +28,13 @@ def v_spacer(height, sb=False) -> None:
         else:
             st.write('\n')
 
+# st.dataframe sends an Arrow table as it is, without copying it into pandas. Categoricals
+# are decoded and strings cast to the utf8 (not large_utf8) type the frontend reads.
+def arrow_table(df: pl.DataFrame) -> pa.Table:
+    table = df.with_columns(pl.col(pl.Categorical).cast(pl.Utf8)).to_arrow()
+    return table.cast(pa.schema([pa.field(field.name, pa.string()) if field.type == pa.large_string() else field
+                                 for field in table.schema]))
+
 ############### Custom Functions Ends ###############
 
 
@@ -48,32 +62,40 @@ config = dict({'scrollZoom': False})
 # @st.cache
 # @st.cache_data
 
+# All data logic lives in query_engine.py, it loads the partitioned dataset
+# (`python data_build.py build`) and the party cube once per process.
+
 # this is to read main data file
-@st.cache_resource
+# not pinned with st.cache_resource, the query engine reloads the dataset by itself when
+# a new election gets appended (python data_build.py append), no restart needed
 def get_data():
-    df = pl.scan_parquet('Elections_Data_Compiled_latest_2025.parquet') # 'Elections_Data_Compiled.parquet'
-    
-    return df
+    # df = pl.scan_parquet('Elections_Data_Compiled_latest_2025.parquet') # 'Elections_Data_Compiled.parquet'
+    return qe.get_dataset()
 
-df = get_data()
+dataset = get_data()
 
 
-# this is to read shape file data
-# @st.cache_resource
-# def get_shape_data():
-#     final_shp_export = gp.read_file('shape_file_exported/final_shp_export.shp').rename(
-#                                                                             columns = {'Criminal_C':'Criminal_Case',
-#                                                                            'Total_Asse':'Total_Assets'})
-    
-#     return final_shp_export
+# figures of recent selections, one LRU cache per process shared by all sessions
+@st.cache_resource
+def get_result_cache():
+    return ResultCache(max_bytes=256 * 2**20)
 
-# final_shp_export = get_shape_data()
+result_cache = get_result_cache()
+
+
+# ... backed by an on-disk cache shared by all worker processes of the machine
+@st.cache_resource
+def get_disk_cache():
+    return DiskCache(DATA_DIR / 'result_cache')
+
+disk_cache = get_disk_cache()
 
 
 # this will get all india top 50 parties for latest election
+# (parquet converted from For_Analysis_in_R.csv by `python data_build.py convert-csv`)
 @st.cache_resource
 def get_data_top_parties():
-    return pl.scan_csv('For_Analysis_in_R.csv')
+    return scan_national()
 
 df_ind = get_data_top_parties()
     
@@ -106,12 +128,13 @@ with st.sidebar:
     # State_List = df.lazy().select(pl.col('State')).unique().collect().to_series().to_list()
     # State_List = df.collect().to_pandas()["State"].unique().tolist()
 
+    # keyed on the dataset version, so an appended State shows up on the next rerun
     @st.cache_data
-    def get_state_list():
+    def get_state_list(version):
         # return get_data().select('State').unique().collect().to_series().to_list()
-        return df.select('State').unique().collect().to_series().to_list()
+        return qe.states()
     
-    State_List = get_state_list()
+    State_List = get_state_list(dataset.version)
     State_index = State_List.index('Delhi')
     # st.write(State_index)
 
@@ -138,13 +161,11 @@ with st.sidebar:
 ############################## SECOND FILTER YEAR ##############################
 
     @st.cache_data
-    def get_year_list(State_Selected):
+    def get_year_list(State_Selected, version):
         
-        return df.filter(pl.col('State') == State_Selected
-                              ).select(pl.col('Year')
-                                       ).unique().collect().to_series().sort().to_list()
+        return qe.years(State_Selected)
     
-    Year_List = get_year_list(State_Selected)
+    Year_List = get_year_list(State_Selected, dataset.version)
 
     Year_Selected = st.multiselect(label="Select Election Year (Latest by default)",
                                      options=Year_List,
@@ -170,48 +191,81 @@ with st.sidebar:
 
 
 
-############################## FILTERED DATA ##############################
+############################## SELECTION RESULT ##############################
+
+# Aggregates and serialized figures of the selected (State, Years), shared by all sessions
+# through the process wide result cache. On a miss the pre-rendered bundle is used when one
+# exists (single year selections), then the on-disk cache another worker may have filled,
+# only otherwise the selected partitions are scanned.
+
+Year_Selected = sorted(Year_Selected)
 
-df_selected = df.filter((pl.col('State') == State_Selected) &
-                    (pl.col('Year').is_in(Year_Selected))
-                    )
+# every section (the trend rollups of the latest selected year too) needs an election year
+if not Year_Selected:
+    st.warning("Select at least one Election Year")
+    st.stop()
 
+# hidden timing panel, open the app with ?debug=1
+debug_panel = st.experimental_get_query_params().get('debug') == ['1']
 
-# final_shp_trimmed = final_shp_export[(final_shp_export.State == State_Selected) & (final_shp_export.Year.isin(Year_Selected))]
-# Top_constituency_df =  final_shp_trimmed[['AC_NAME','Criminal_Case']].nlargest(n = 1, columns='Criminal_Case')
-# Top_constituency_name = Top_constituency_df['AC_NAME'].item()
-# Top_constituency_crime = Top_constituency_df['Criminal_Case'].item()
-############################## FILTERED DATA DONE ##############################    
+rerun_trace = start_trace('rerun', capture_plans=debug_panel, State=State_Selected, Years=Year_Selected)
 
+selection_cache_key = selection_key(State_Selected, Year_Selected, qe.version(State_Selected))
 
+def cached_selection():
+    selection = load_bundle(State_Selected, Year_Selected)
+    if not complete_result(selection):
+        selection = disk_cache.get(selection_cache_key)
 
+    return selection if complete_result(selection) else None
 
+with span('SELECTION RESULT'):
+    selection = result_cache.get(selection_cache_key)
+    if selection is None:
+        selection = cached_selection()
+        if selection is not None:
+            result_cache.put(selection_cache_key, selection)
 
-############################## USEFUL AGGREGATIONS & LIST ##############################
 
-cases_agg_2022 = df_selected.groupby(['Party']).agg(
-    [
-    (pl.col('Party').count().alias('candidates_count')),
-    (pl.col('Criminal_Case').sum().alias('total_criminal_cases'))
-    ]
-).with_columns(
-    (pl.col('total_criminal_cases') / pl.col('candidates_count') ).alias('avg_cases')
-).sort(by = 'total_criminal_cases', descending = True)
+# On a miss every figure is built on the thread pool while the page is laid out, each
+# chart gets an st.empty() placeholder and is drawn into it as soon as its own figure is
+# ready (see RENDER PENDING CHARTS at the end of the page).
+@st.cache_resource
+def get_executor():
+    from figures import warm_json_engine
+
+    # once, before any worker serializes a figure
+    warm_json_engine()
 
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix='figures')
 
+if selection is None:
+    figure_futures = submit_selection(get_executor(), State_Selected, Year_Selected)
+else:
+    figure_futures = {}
 
-Major_Parties = (
-    cases_agg_2022
-    .filter(pl.col('total_criminal_cases')>0)
-    .sort('total_criminal_cases',descending = True)
-    .head(6)
-    .select(pl.col('Party'))
-    .collect()
-    .to_series()
-    .to_list()
-)
+pending_slots = {}   # figure name -> placeholder still waiting for it
 
-############################## USEFUL AGGREGATIONS & LIST DONE ##############################
+# the cached json was produced by plotly itself, so it is not validated a second time
+def figure_from_json(figure_json):
+    return go.Figure(json.loads(figure_json), _validate=False)
+
+def show(name, container=st):
+    slot = container.empty()
+    if name in figure_futures:
+        slot.caption("Loading chart ...")
+        pending_slots[name] = slot
+    else:
+        slot.plotly_chart(figure_from_json(selection['figures'][name]),use_container_width=True, config = config)
+
+
+with st.sidebar:
+    with st.expander("Result cache statistics"):
+        st.json(result_cache.stats())
+        st.json(disk_cache.stats())
+
+
+############################## SELECTION RESULT DONE ##############################
 
 
 
@@ -229,55 +283,19 @@ with parties_2:
 
 
 ############################## FIRST PLOT ##############################
-plt_box_1,plt_box_2 = st.columns([5,2],gap = "small")
-
-highest_criminal_parties = df_selected.groupby(['Party']
-                                ).agg(pl.col('Criminal_Case').sum()
-                                ).sort(by='Criminal_Case',descending=True)
-
-highest_criminal_party = highest_criminal_parties.select(pl.col('Party')).head(1).collect().to_series().to_list()
-# highest_criminal_party6 = highest_criminal_parties.select(pl.col('Party')).head(6).to_series().to_list()
-
-with plt_box_1:
-
-    fig_party_crime_sum = px.bar(highest_criminal_parties.head(18).collect().to_pandas(),
-                                orientation='h',
-                                x='Criminal_Case',y='Party', color="Party",
-                                hover_name='Party',
-                                labels={
-                                        "Criminal_Case": "Total Criminal Cases",
-                                        "Party": "Political Parties"
-                                    },
-                            
-                            title=f'<b>Top 18 Political Parties with Highest Total Criminal Records from {State_Selected} in {Year_Selected} Elections</b>')
-
-    # fig_party_crime_sum.update_yaxes(autorange="reversed")
-    fig_party_crime_sum.update_layout(title_font_size=18, height = 500, 
-                                        showlegend=False
-                                        )
-    fig_party_crime_sum.add_annotation(
-                                        showarrow=False,
-                                        text='Data Source: https://myneta.info/',
-                                        xanchor='right',
-                                        x=2,
-                                        xshift=575,
-                                        yanchor='bottom',
-                                        y=0.01 #,
-                                        # font=dict(
-                                        #     family="Courier New, monospace",
-                                        #     size=22,
-                                        #     color="#0000FF"
-                                    )
-
-    st.plotly_chart(fig_party_crime_sum,use_container_width=True, config = config)
-
-
-with plt_box_2:
-    v_spacer(8)
-
-    st.write(f"*This Plot* demostrates the total number of criminal cases on the candidates of each party from the  \
-            respective state of {State_Selected} in election year {Year_Selected} with maximum number of criminal cases at the top and lowest  \
-            at the bottom. It considers top 18 Political Parties only.")
+with span('FIRST PLOT'):
+    plt_box_1,plt_box_2 = st.columns([5,2],gap = "small")
+
+    with plt_box_1:
+        show('party_crime_sum')
+
+
+    with plt_box_2:
+        v_spacer(8)
+
+        st.write(f"*This Plot* demostrates the total number of criminal cases on the candidates of each party from the  \
+                respective state of {State_Selected} in election year {Year_Selected} with maximum number of criminal cases at the top and lowest  \
+                at the bottom. It considers top 18 Political Parties only.")
 
 ############################## FIRST PLOT DONE ##############################
 
@@ -286,36 +304,17 @@ with plt_box_2:
 
 ############################## BOX PLOT ##############################
 
-boxplt_1,boxplt_2 = st.columns([2,5],gap = "small")
-
-with boxplt_2:
-    fig_party_crime_box = px.box(df_selected.filter(
-            (pl.col('Party').is_in(Major_Parties)) # highest_criminal_parties.select(pl.col('Party')).head(6).to_series().to_list()
-                                    ).collect().to_pandas(),
-            x = 'Party',
-            y = 'Criminal_Case',
-            color= 'Party',
-            hover_name='Party',
-            points = 'all', # will display dots next to the boxes 
-            labels={
-                        "Criminal_Case": "Count of Criminal Cases on Individual",
-                        "Party": "Political Parties"
-                                        },
-                                
-                                title=f'<b>Top 6 Political Parties with Individual Criminal Record points & boxplot from<br> {State_Selected} in {Year_Selected} Elections</b>'
-        ).update_layout(
-        title_font_size=18, height = 450, 
-        # xaxis=dict(autorange="reversed")
-        # plot_bgcolor = 'white'
-        )
-
-    st.plotly_chart(fig_party_crime_box,use_container_width=True, config = config)
-
-with boxplt_1:
-    v_spacer(9)
-
-    st.write(f"*This Plot* shows each Individual Candidate as a point with respect to number of criminal cases against it for each Political Party from the  \
-            respective state of {State_Selected} in election year {Year_Selected}. It considers top 6 Political Parties only.")
+with span('BOX PLOT'):
+    boxplt_1,boxplt_2 = st.columns([2,5],gap = "small")
+
+    with boxplt_2:
+        show('party_crime_box')
+
+    with boxplt_1:
+        v_spacer(9)
+
+        st.write(f"*This Plot* shows each Individual Candidate as a point with respect to number of criminal cases against it for each Political Party from the  \
+                respective state of {State_Selected} in election year {Year_Selected}. It considers top 6 Political Parties only.")
 
 ############################## BOX PLOT DONE ##############################
 
@@ -324,39 +323,19 @@ with boxplt_1:
 
 ############################## FACET PLOT DONE ##############################
 
-plt3_box_1,plt3_box_2 = st.columns([6,1],gap = "small")
+with span('FACET PLOT'):
+    plt3_box_1,plt3_box_2 = st.columns([6,1],gap = "small")
 
-with plt3_box_2:
-    v_spacer(6)
+    with plt3_box_2:
+        v_spacer(6)
 
-    st.write(f"*This Plot* shows the count of candidates with highest number of criminal cases in their Party in  \
-            respect to state of {State_Selected} in election year {Year_Selected} with maximum number of criminal cases on an indiviual at the top and lowest  \
-            at the bottom. It considers top 6 Political Parties only and Individuals with  greater than 3 Criminal Cases.")
+        st.write(f"*This Plot* shows the count of candidates with highest number of criminal cases in their Party in  \
+                respect to state of {State_Selected} in election year {Year_Selected} with maximum number of criminal cases on an indiviual at the top and lowest  \
+                at the bottom. It considers top 6 Political Parties only and Individuals with  greater than 3 Criminal Cases.")
     
 
-with plt3_box_1:
-    fig_cases_count_party_facet = px.bar(df_selected.filter(pl.col('Party').is_in(Major_Parties) & 
-                                        (pl.col('Criminal_Case') > 3)).sort(
-                                        by='Criminal_Case', descending=True
-                                        ).groupby(
-                                        ['Party','Criminal_Case'], maintain_order=True).count().collect().to_pandas(),
-                                        orientation='h',
-                                        x='count',y='Criminal_Case', color="Party",
-                                        hover_name='Party',
-                                        facet_col="Party", facet_col_wrap=3,
-                                        labels={
-                                                "Criminal_Case": "Criminal Cases on a Candidate",
-                                                "count": "Count of candidates with Cases #"
-                                            },
-                                        
-                                        title=f'<b>Top 6 Parties with Highest number of Criminal Record Candidate in {State_Selected} {Year_Selected} Elections</b>'
-                            )
-
-    fig_cases_count_party_facet.update_layout(title_font_size=18, height = 600, 
-                                        showlegend=False
-                                        )
-
-    st.plotly_chart(fig_cases_count_party_facet,use_container_width=True, config = config)
+    with plt3_box_1:
+        show('cases_count_party_facet')
 
 ############################## FACET PLOT DONE ##############################
 
@@ -370,55 +349,20 @@ st.write("It is also important to see not just the 'Total Criminal Records' but
 
 ############################## 3 PLOTS ##############################
 
-fig_party_cand_count = px.bar(cases_agg_2022.sort(by='candidates_count',descending=True
-                                ).head(18).collect().to_pandas(),
-                                orientation='h',
-                                x='candidates_count',y='Party', color="Party",
-                                hover_name='Party',
-                                labels={
-                                        "candidates_count": "Total Candidates",
-                                        "Party": "Political Parties"
-                                    },
-                            
-                            title=f'<b>Highest Total Candidates in {Year_Selected} Elections</b>'
-                            )
-fig_party_cand_count.update_layout(title_font_size=16, height = 600, 
-                                    showlegend=False
-                                    )
-
-fig_party_crime_sum2 = fig_party_crime_sum
-
-fig_party_crime_sum2.update_layout(title_font_size=16, height = 600, 
-                                    showlegend=False, 
-                                    title_text = f'<b>Highest Total Criminal Cases in {Year_Selected} Elections</b>'
-                                    )
-
-fig_party_avg_cases = px.bar(cases_agg_2022.sort(by='avg_cases',descending=True
-                                ).head(18).collect().to_pandas(),
-                                orientation='h',
-                                x='avg_cases',y='Party', color="Party",
-                                hover_name='Party',
-                                labels={
-                                        "avg_cases": "Average Case (Cases/Candidates) ",
-                                        "Party": "Political Parties"
-                                    },
-                            
-                            title=f'<b>Highest Average Criminal Cases in {Year_Selected} Elections</b>'
-                            )
-fig_party_avg_cases.update_layout(title_font_size=16, height = 600, 
-                                    showlegend=False
-                                    )
-
-plt1_left,plt1_mid,plt1_right = st.columns([1,1,1],gap = "small")
-
-with plt1_left:
-    st.plotly_chart(fig_party_cand_count,use_container_width=True, config = config)
-
-with plt1_mid:
-    st.plotly_chart(fig_party_crime_sum2,use_container_width=True, config = config)
-
-with plt1_right:
-    st.plotly_chart(fig_party_avg_cases,use_container_width=True, config = config)
+with span('3 PLOTS'):
+    plt1_left,plt1_mid,plt1_right = st.columns([1,1,1],gap = "small")
+
+    with plt1_left:
+        show('party_cand_count')
+
+    with plt1_mid:
+        show('party_crime_sum2')
+
+    with plt1_right:
+        Avg_Rank = st.radio(label="Rank parties by", options=["Average", "Lower end of 95% interval"],
+                            horizontal=True)
+
+        show('party_avg_cases' if Avg_Rank == "Average" else 'party_avg_cases_lower')
 
 ############################## 3 PLOTS DONE ##############################
 
@@ -441,112 +385,91 @@ with Asset_mark_2:
 
 ############################## ASSET PLOTS ##############################
 
-asset_1,asset_2 = st.columns([2,1],gap = "small")
-
-with asset_1:    
-    # fig_party_asset_sum = px.bar(df_selected.groupby(['Party']
-    #                             ).agg(pl.col('Total_Assets').sum()
-    #                             ).sort(by='Total_Assets',descending=True
-    #                             ).head(18).collect().to_pandas(),
-    #                             orientation='h',
-    #                             x='Total_Assets',y='Party', color="Party",
-    #                             hover_name='Party',
-    #                             labels={
-    #                                     "Total_Assets": "Total Assets (in Rs.)",
-    #                                     "Party": "Political Parties"
-    #                                 },
-                            
-    #                         title=f'<b>Top 18 Political Parties with Highest Total Sum of Assets of candidates <br>from {State_Selected} in {Year_Selected} Elections</b>')
-
-# converting above code to facet year
-    fig_party_asset_sum = px.bar(df.filter(pl.col('State') == State_Selected).groupby(['Party','Year']
-                                    ).agg(pl.col('Total_Assets').sum()/10**7
-                                    ).sort(by='Total_Assets',descending=True
-                                    ).head(18).collect().to_pandas(),
-                                    orientation='h',
-                                    x='Total_Assets',y='Party', color="Party",
-                                    facet_col="Year", facet_col_wrap=2,
-                                    hover_name='Party',
-                                    labels={
-                                            "Total_Assets": "Total Assets (in Crore Rs.)",
-                                            "Party": "Political Parties"
-                                        },
-                                
-                                title=f'<b>Top 18 Political Parties with Highest Total Sum of Assets of candidates <br>from {State_Selected} in Elections</b>')
-
-                                        
-
-
-    # fig_party_crime_sum.update_yaxes(autorange="reversed")
-    fig_party_asset_sum.update_layout(title_font_size=18, height = 500, 
-                                        showlegend=False
-                                        )
-    # fig_party_asset_sum.update_traces(hovertemplate= 'Rs. %{x:.2f}')
-
-    # fig_party_asset_sum.add_annotation(
-    #                                     showarrow=False,
-    #                                     text='Data Source: https://myneta.info/',
-    #                                     xanchor='right',
-    #                                     x=2,
-    #                                     xshift=575,
-    #                                     yanchor='bottom',
-    #                                     y=0.01 #,
-    #                                     # font=dict(
-    #                                     #     family="Courier New, monospace",
-    #                                     #     size=22,
-    #                                     #     color="#0000FF"
-    #                                 )
-
-    st.plotly_chart(fig_party_asset_sum,use_container_width=True, config = config)
-
-
-
-with asset_2:
-    fig_party_asset_buble = px.scatter(df_selected.filter(
-                                        (pl.col('Party').is_in(Major_Parties)) 
-                                        ).collect().to_pandas(),
-                                        x = 'Party',
-                                        y = 'Total_Assets',
-                                        hover_name='Party',
-                                        color = 'Party', # will display dots next to the boxes 
-                                        labels={
-                                                    "Total_Assets": "Total Assets (in Rs) of Candidate",
-                                                    "Party": "Political Parties"
-                                                                    },
-                                                            
-                                title=f'<b>Top 6 Political Parties with Individual <br>Total Asset Record points from {State_Selected} <br>in {Year_Selected} Elections</b>'
-        ).update_layout(
-        title_font_size=18, height = 500,
-        showlegend = False
-        )
-
-    st.plotly_chart(fig_party_asset_buble,use_container_width=True, config = config)
+with span('ASSET PLOTS'):
+    asset_1,asset_2 = st.columns([2,1],gap = "small")
+
+    with asset_1:
+        show('party_asset_sum')
+
+
+    with asset_2:
+        show('party_asset_buble')
 
 ############################## ASSET PLOTS DONE ##############################
 
 
 
 
+############################## LIABILITY PLOTS ##############################
+
+with span('LIABILITY PLOTS'):
+    liability_1,liability_2 = st.columns([1,1],gap = "small")
+
+    with liability_1:
+        show('party_liability_sum')
+
+
+    with liability_2:
+        show('party_net_worth')
+
+############################## LIABILITY PLOTS DONE ##############################
+
+
+
+
+############################## TREND PLOT ##############################
+
+# latest selected election against the previous election of the State (trend rollups)
+with span('TREND PLOT'):
+    trend_1,trend_2 = st.columns([1,1],gap = "small")
+
+    with trend_1:
+        show('rising_parties')
+
+
+    with trend_2:
+        Trend_Year = qe.trend_year(State_Selected, Year_Selected)
+
+        if Trend_Year is None:
+            st.info(f"{State_Selected} {max(Year_Selected)} is the first election on record, "
+                    "there is no previous election to compare with.")
+        else:
+            const_trends = qe.constituency_trends(State_Selected, [Trend_Year]
+                                        ).sort(by='total_criminal_cases_delta', descending=True)
+
+            st.markdown(f"**Change in Criminal Cases by Constituency, {State_Selected} {Trend_Year} "
+                        "vs previous Election**")
+            st.dataframe(const_trends.select(['Constituency', 'prev_total_criminal_cases', 'total_criminal_cases',
+                                              'total_criminal_cases_delta', 'candidates_count_delta']
+                                    ).pipe(arrow_table),
+                         use_container_width=True, height=440)
+
+############################## TREND PLOT DONE ##############################
+
+
+
+
+############################## REPEAT CANDIDATES PLOT ##############################
+
+# the same politician across the elections of the State (person_id, see entity_resolution)
+with span('REPEAT CANDIDATES PLOT'):
+    repeat_1,repeat_2 = st.columns([1,1],gap = "small")
+
+    with repeat_1:
+        show('repeat_offenders')
+
+    with repeat_2:
+        show('asset_growth')
+
+############################## REPEAT CANDIDATES PLOT DONE ##############################
+
+
+
+
 ############################## ASSET CRIME BUBBLE PLOT ##############################
 
-fig_crime_asset_buble = px.scatter(df_selected.filter(pl.col('Party').is_in(Major_Parties)).collect().to_pandas(),
-                                    x='Criminal_Case',y='Total_Assets', color="Party",
-                                    hover_name="Party",
-                                    # size = 'Total_Assets',
-                                    labels={
-                                            "Criminal_Case": "Total Criminal Cases",
-                                            "Party": "Political Parties",
-                                            "Total_Assets": "Total Assets (in Rs) of Candidate"
-                                        },
-                        
-                        title=f'<b>Total Asset of Individual Vs Criminal Cases of Top 6 Political Parties from {State_Selected} in {Year_Selected} Elections</b>')
-
-# fig_party_crime_sum.update_yaxes(autorange="reversed")
-fig_crime_asset_buble.update_layout(title_font_size=18, height = 500, 
-                                    # showlegend=False
-                                    )
-
-st.plotly_chart(fig_crime_asset_buble,use_container_width=True, config = config)
+with span('ASSET CRIME BUBBLE PLOT'):
+    show('crime_asset_buble')
 
 ############################## ASSET CRIME BUBBLE PLOT DONE ##############################
 
@@ -569,70 +492,12 @@ with Const_2:
 
 ############################## EDUCATION BUBBLE PLOT ##############################
 
-# fig__edu_crime_buble = px.scatter(df_selected.filter((pl.col('Party').is_in(Major_Parties)) &
-#                                                      (pl.col('Criminal_Case') > 0)).collect().to_pandas(),
-#                                     x='Education',y='Criminal_Case', color="Party", size = "Total_Assets",
-#                                     hover_name="Party", opacity=0.5,
-#                                     labels={
-#                                             "Criminal_Case": "Total Criminal Cases",
-#                                             "Party": "Political Parties",
-#                                             "Total_Assets": "Total Assets (in Rs) of Candidate"
-#                                         },
-                        
-#                         title=f'<b>Criminal Cases of Top 6 Political Parties by Education(Size wrt to Total Assets) from {State_Selected} in {Year_Selected} Elections</b>')
-
-
-# fig__edu_crime_buble.update_layout(title_font_size=18, height = 500
-#                                     # showlegend=False
-#                                     )
-
-tab11, tab21 = st.tabs(["🗃 Facet By Political Party","📈 Facet By Education"])
-
-fig__edu_crime_buble = px.scatter(df_selected.filter((pl.col('Party').is_in(Major_Parties)) &
-                                                            (pl.col('Criminal_Case') > 0)).collect().to_pandas(),
-                                            x = 'Criminal_Case', y = 'Total_Assets', color='Education', size='Criminal_Case',
-                                            facet_col='Party', facet_col_wrap=3, opacity=0.6,
-                                            labels={
-                                                    "Criminal_Case": "Criminal Cases",
-                                                    "Party": "Political Parties",
-                                                    "Total_Assets": "Total Assets (in Rs)"
-                                                },
-                                            # from: https://plotly.com/python/facet-plots/?_gl=1*queipu*_ga*MTU0Nzk1NDk2NC4xNjgyMTYyMDYz*_ga_6G7EE0JNSC*MTY4MjY3NjAzOC4yOC4wLjE2ODI2NzYwNDUuMC4wLjA.#controlling-facet-ordering
-                                            category_orders={"Education": ["Doctorate","Post Graduate", "Graduate", "Graduate Professional", 
-                                                                        "12th Pass","10th Pass","8th Pass","5th Pass","Others","Literate"
-                                                                        "Illiterate","Not Given"]},
-                                
-                                title=f'<b>Criminal Cases of Top 6 Political Parties by Education(Size wrt to Criminal Cases) from {State_Selected} in {Year_Selected} Elections</b>'
-                                ).update_layout(title_font_size=18, height = 600
-                                            # showlegend=False
-                                            # plot_bgcolor = 'rgba(0, 0, 0, 0)',
-                                            # paper_bgcolor = 'rgba(0, 0, 0, 0)'
-                                            )
-
-tab11.plotly_chart(fig__edu_crime_buble,use_container_width=True, config = config)
-
-fig__edu_crime_buble_facet2 = px.scatter(df_selected.filter((pl.col('Party').is_in(Major_Parties)) &
-                                                            (pl.col('Criminal_Case') > 0)).collect().to_pandas(),
-                                            x = 'Criminal_Case', y = 'Total_Assets', color='Party', size='Criminal_Case',
-                                            facet_col='Education', facet_col_wrap=3, opacity=0.6,
-                                            labels={
-                                                    "Criminal_Case": "Criminal Cases",
-                                                    "Party": "Political Parties",
-                                                    "Total_Assets": "Total Assets (in Rs)"
-                                                },
-                                            # from: https://plotly.com/python/facet-plots/?_gl=1*queipu*_ga*MTU0Nzk1NDk2NC4xNjgyMTYyMDYz*_ga_6G7EE0JNSC*MTY4MjY3NjAzOC4yOC4wLjE2ODI2NzYwNDUuMC4wLjA.#controlling-facet-ordering
-                                            category_orders={"Education": ["Doctorate","Post Graduate", "Graduate", "Graduate Professional", 
-                                                                        "12th Pass","10th Pass","8th Pass","5th Pass","Others","Literate"
-                                                                        "Illiterate","Not Given"]},
-                                
-                                title=f'<b>Criminal Cases of Top 6 Political Parties by Education(Size wrt to Criminal Cases) from {State_Selected} in {Year_Selected} Elections</b>'
-                                ).update_layout(title_font_size=18, height = 700
-                                            # showlegend=False
-                                            # plot_bgcolor = 'rgba(0, 0, 0, 0)',
-                                            # paper_bgcolor = 'rgba(0, 0, 0, 0)'
-                                            )
-
-tab21.plotly_chart(fig__edu_crime_buble_facet2,use_container_width=True, config = config)
+with span('EDUCATION BUBBLE PLOT'):
+    tab11, tab21 = st.tabs(["🗃 Facet By Political Party","📈 Facet By Education"])
+
+    show('edu_crime_buble', tab11)
+
+    show('edu_crime_buble_facet2', tab21)
 
 
 ############################## EDUCATION BUBBLE PLOT DONE ##############################
@@ -642,6 +507,7 @@ tab21.plotly_chart(fig__edu_crime_buble_facet2,use_container_width=True, config
 
 
 
+
 ############################## ALL INDIA BUBBLE PLOT ##############################
 
 # fig__all_ind_parties_buble = px.strip(df_ind.filter((pl.col('Criminal_Case') > 0)).collect().to_pandas(),
@@ -650,7 +516,25 @@ tab21.plotly_chart(fig__edu_crime_buble_facet2,use_container_width=True, config
 #             ).update_layout(height = 1400).update_yaxes(type='category', categoryorder='max ascending'
 #                                                         ).update_traces(jitter = 1, opacity = 0.7)
 
-# st.plotly_chart(fig__all_ind_parties_buble,use_container_width=True, config = config)
+# same view from the (Party, State) summary, built once per conversion of the national
+# data: the json is kept in the disk cache, a new process only reads it
+@st.cache_resource
+def get_all_india_figure():
+    all_india_key = ('all_india', national_version())
+
+    figure_json = disk_cache.get(all_india_key)
+    if figure_json is None:
+        from figures import all_india_parties
+
+        figure_json = all_india_parties(read_national_summary()).to_json()
+        disk_cache.put(all_india_key, figure_json)
+
+    return figure_json
+
+with span('ALL INDIA BUBBLE PLOT'):
+    fig__all_ind_parties_buble = go.Figure(json.loads(get_all_india_figure()), _validate=False)
+
+    st.plotly_chart(fig__all_ind_parties_buble,use_container_width=True, config = config)
 
 ############################## ALL INDIA BUBBLE PLOT DONE ##############################
 
@@ -676,96 +560,57 @@ with Const_2:
 
 ############################## CONSTITUENCY PLOT ##############################
 
-# cons_map_1,cons_map_2 = st.columns([1,6], gap="small")
-
-# with cons_map_1:
-#     v_spacer(12)
-
-#     st.write(f"{Top_constituency_name} with total {Top_constituency_crime} Criminal Cases by all candidates is at the top position of constituencies.")
-
-# with cons_map_2:
-#     fig_choropleth_assembly = px.choropleth(
-#                                                     data_frame= final_shp_trimmed,
-#                                                     geojson=final_shp_trimmed.__geo_interface__,
-#                                                     locations=final_shp_trimmed.index.astype(str),
-#                                                     color_continuous_scale="magma",
-#                                                     # range_color = (0,12), 
-#                                                     color = "Criminal_Case",
-#                                                     hover_name='AC_NAME',
-#                                                     hover_data=["Criminal_Case", "Total_Assets"]
-#                                                     # hover_data = {'locations':False, # https://stackoverflow.com/questions/74614344/selecting-hover-on-plotly-choropleth-map
-#                                                     #               'Criminal_Case':True
-#                                                     #               }
-#                                                     # title=f'{Top_constituency} is the Top Constituency'
-#                                                     )
-
-#     fig_choropleth_assembly.update_geos(fitbounds="locations", visible=False
-#                                         ).update_layout(
-#                                     paper_bgcolor = 'rgba(0, 0, 0, 0)',
-#                                     geo=dict(bgcolor= 'rgba(0,0,0,0)'), 
-#                                     # hoverlabel = {'bgcolor': 'rgba(0,0,0,0)'},
-#                                     height = 580, width = 450
-#                                     )
-
-
-#     st.plotly_chart(fig_choropleth_assembly,use_container_width=True, config = config)
-
-
-############################### Exapnder for Constituency Bar plot ###############################
-# with st.expander("See explanation"):
-
-tab21, tab22 = st.tabs(["🗃 Top 6 Political Parties","📈 All Political Parties"])
-
-fig_const_crime_sum = px.bar(
-                                    df_selected.filter(
-                                        pl.col('Party').is_in(Major_Parties)).groupby(['Constituency','Party']
-                                        ).agg(pl.col('Criminal_Case').sum()
-                                        ).sort(by='Criminal_Case',descending=True
-                                        ).collect(
-                                        ).to_pandas()
-                                        
-                                        ,
-                                    orientation='v',
-                                    barmode = 'stack', 
-                                    x='Constituency',y='Criminal_Case', color="Party",
-                                    hover_name="Constituency", 
-                                    
-                                    labels={
-                                            "Total_Assets": "Total Assets (in Rs.)",
-                                            "Party": "Political Parties"
-                                        },
-                                    
-                                    title=f'<b>Constituencies with highest Criminal Cases Candidates of Top 6 Parties from {State_Selected[0]} in {Year_Selected[0]} Elections</b>'
-                                    # title= " ".join('Constituencies with highest Criminal Cases Candidates of Top 6 Parties from', State_Selected[0], 'in', Year_Selected[0], 'Elections'))
-
-).update_xaxes(autorange="reversed").update_layout(title_font_size=18, height = 600, 
-                                        # showlegend=False
-                                        )
-
-tab21.plotly_chart(fig_const_crime_sum,use_container_width=True, config = config)
-
-
-fig_const_crime_sum_all = px.bar(
-                                    df_selected.groupby(['Constituency','Party']
-                                        ).agg(pl.col('Criminal_Case').sum()
-                                        ).sort(by='Criminal_Case',descending=True
-                                        ).collect(
-                                        ).to_pandas(),
-                                    orientation='v',
-                                    barmode = 'stack', 
-                                    x='Constituency',y='Criminal_Case', color="Party",
-                                    hover_name="Constituency",
-                                    labels={
-                                            "Total_Assets": "Total Assets (in Rs.)",
-                                            "Party": "Political Parties"
-                                        },
-                                    
-                                    title=f'<b>Constituencies with highest Criminal Cases Candidates from {State_Selected} in {Year_Selected} Elections</b>'
-).update_xaxes(autorange="reversed").update_layout(title_font_size=18, height = 600, 
-                                        # showlegend=False
-                                        )                                    
-
-tab22.plotly_chart(fig_const_crime_sum_all,use_container_width=True, config = config)
+with span('CONSTITUENCY PLOT'):
+    # simplified State geometry, loaded on first use and only when the store was built
+    state_geometry = load_state_geometry(State_Selected)
+
+    # crime and asset numbers from the constituency index, also used by the drill-down below
+    const_totals = qe.constituency_totals(State_Selected, Year_Selected)
+
+    map_frame = constituency_map_frame(state_geometry, const_totals) if state_geometry else None
+
+    if map_frame and map_frame['AC_NAME']:
+        Top_constituency_idx = max(range(len(map_frame['AC_NAME'])), key=map_frame['Criminal_Case'].__getitem__)
+        Top_constituency_name = map_frame['AC_NAME'][Top_constituency_idx]
+        Top_constituency_crime = map_frame['Criminal_Case'][Top_constituency_idx]
+
+        cons_map_1,cons_map_2 = st.columns([1,6], gap="small")
+
+        with cons_map_1:
+            v_spacer(12)
+
+            st.write(f"{Top_constituency_name} with total {Top_constituency_crime} Criminal Cases by all candidates is at the top position of constituencies.")
+
+        with cons_map_2:
+            from figures import constituency_choropleth
+
+            fig_choropleth_assembly = constituency_choropleth(map_frame, state_geometry['geojson'])
+
+            st.plotly_chart(fig_choropleth_assembly,use_container_width=True, config = config)
+
+
+    ############################### Exapnder for Constituency Bar plot ###############################
+    # with st.expander("See explanation"):
+
+    tab21, tab22 = st.tabs(["🗃 Top 6 Political Parties","📈 All Political Parties"])
+
+    show('const_crime_sum', tab21)
+
+
+    show('const_crime_sum_all', tab22)
+
+
+    ############################### Constituency drill-down ###############################
+    # candidates of one constituency, a row range of each selected partition (constituency index)
+    with st.expander(f"See the candidates of a constituency of {State_Selected}"):
+        Constituency_Selected = st.selectbox(label="Select Constituency (highest Criminal Cases first)",
+                                             options=const_totals.get_column('Constituency').cast(pl.Utf8).to_list())
+
+        if Constituency_Selected is not None:
+            const_candidates = qe.constituency_candidates(State_Selected, Year_Selected, Constituency_Selected)
+
+            st.dataframe(const_candidates.pipe(arrow_table),
+                         use_container_width=True)
 
 
 ############################## CONSTITUENCY PLOT DONE ##############################
@@ -773,6 +618,60 @@ tab22.plotly_chart(fig_const_crime_sum_all,use_container_width=True, config = co
 
 
 
+############################## CANDIDATE SEARCH ##############################
+
+# any candidate of any State and year by name (trigram index, typos and spelling variants match)
+st.divider()
+
+with span('CANDIDATE SEARCH'):
+    Search_1,Search_2,Search_3 = st.columns([1,8,1],gap = "small")
+
+    with Search_2:
+        st.markdown('<p class="big-font">Find a Candidate</p>', unsafe_allow_html=True)
+
+        Candidate_Query = st.text_input(label="Candidate name (all States and Years)",
+                                        placeholder="e.g. Arvind Kejriwal")
+
+        if Candidate_Query:
+            search_result = qe.search_candidates(Candidate_Query)
+
+            if search_result.is_empty():
+                st.info(f"No candidate found for '{Candidate_Query}'")
+            else:
+                st.dataframe(search_result.drop(['row_id', 'score']).pipe(arrow_table),
+                             use_container_width=True)
+
+############################## CANDIDATE SEARCH DONE ##############################
+
+
+
+
+############################## DOWNLOAD DATA ##############################
+
+# the rows and aggregates behind the charts of the selection, encoded chunk by chunk from
+# the polars plans (see export.py) only once asked for. Exports of every State and year
+# are streamed by the API server (/api/export) instead of being built in the app.
+with span('DOWNLOAD DATA'):
+    with st.expander(f"Download the data of {State_Selected} {Year_Selected} Elections"):
+        Export_Table = st.selectbox(label="Data", options=list(EXPORT_TABLES),
+                                    format_func=lambda table: table.replace('_', ' ').capitalize())
+
+        Export_Format = st.radio(label="Format", options=list(EXPORT_FORMATS), horizontal=True)
+
+        if st.button("Prepare file"):
+            with st.spinner("Preparing file ..."):
+                export_data = b''.join(export_bytes(EXPORT_TABLES[Export_Table](State_Selected, Year_Selected),
+                                                    Export_Format))
+
+            st.download_button(label=f"Download {Export_Format}", data=export_data,
+                               file_name=export_filename(Export_Table, Export_Format, State_Selected, Year_Selected),
+                               mime=EXPORT_FORMATS[Export_Format][0])
+
+############################## DOWNLOAD DATA DONE ##############################
+
+
+
+
 
 
 ############################## DISCALIMER ##############################
@@ -791,3 +690,49 @@ with box_left:
                \n Would request the viewers to visit https://myneta.info/ for more details and original content.")
     
 ############################## DISCALIMER DONE ##############################
+
+
+
+
+
+############################## RENDER PENDING CHARTS ##############################
+
+# charts are drawn in the order their figures finish, the first ones already show while
+# the rest of the page is still being built; the complete result is cached afterwards
+if figure_futures:
+    with span('RENDER PENDING CHARTS'):
+        # figures not shown on this rerun (the other ranking of a chart) are only cached
+        names = {future: name for name, future in figure_futures.items() if name in pending_slots}
+        for future in as_completed(names):
+            pending_slots[names[future]].plotly_chart(figure_from_json(future.result()),
+                                                      use_container_width=True, config = config)
+
+        selection = collect_selection(figure_futures)
+        result_cache.put(selection_cache_key, selection)
+        disk_cache.put(selection_cache_key, selection)
+
+############################## RENDER PENDING CHARTS DONE ##############################
+
+
+
+
+############################## DEBUG PANEL ##############################
+
+if debug_panel:
+    with st.sidebar:
+        with st.expander("Rerun timings", expanded=True):
+            st.dataframe(pl.DataFrame([{'span': '  ' * record['depth'] + record['name'],
+                                        'ms': round(record['seconds'] * 1000, 2)}
+                                       for record in rerun_trace.spans]).pipe(arrow_table),
+                         use_container_width=True)
+
+        with st.expander("Polars query plans"):
+            if not rerun_trace.plans:
+                st.write("Served from the result cache or a figure bundle, no queries ran on this rerun.")
+            for name, plan in rerun_trace.plans.items():
+                st.caption(name)
+                st.code(plan)
+
+end_trace(rerun_trace)
+
+############################## DEBUG PANEL DONE ##############################
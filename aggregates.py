@@ -0,0 +1,180 @@
+import polars as pl
+
+
+############### Party Cube ###############
+
+# (State, Year, Party) rollup of candidate rows. Every party level chart is
+# computed by summing cube rows for the selected years instead of grouping the
+# candidate rows again on each rerun.
+
+CUBE_KEYS = ['State', 'Year', 'Party']
+
+# (lower, upper, column) - upper is inclusive, None means open ended
+CASE_BUCKETS = [
+    (0, 0, 'cases_0'),
+    (1, 1, 'cases_1'),
+    (2, 3, 'cases_2_3'),
+    (4, 5, 'cases_4_5'),
+    (6, 10, 'cases_6_10'),
+    (11, None, 'cases_11_plus'),
+]
+
+BUCKET_COLUMNS = [name for _, _, name in CASE_BUCKETS]
+
+# money sums, rupees and the pre-scaled crore columns
+MONEY_COLUMNS = ['Total_Assets', 'Liabilities', 'Net_Worth',
+                 'Total_Assets_Cr', 'Liabilities_Cr', 'Net_Worth_Cr']
+
+
+def _bucket_expr(lower, upper, name) -> pl.Expr:
+    in_bucket = pl.col('Criminal_Case') >= lower
+    if upper is not None:
+        in_bucket = in_bucket & (pl.col('Criminal_Case') <= upper)
+
+    return in_bucket.cast(pl.UInt32).sum().alias(name)
+
+
+def build_party_cube(df: pl.LazyFrame) -> pl.LazyFrame:
+    return df.groupby(CUBE_KEYS).agg(
+        [
+        pl.col('Party').count().cast(pl.UInt32).alias('candidates_count'),
+        pl.col('Criminal_Case').sum().cast(pl.Int64).alias('total_criminal_cases'),
+        ] + [pl.col(name).sum() for name in MONEY_COLUMNS]
+          + [_bucket_expr(*bucket) for bucket in CASE_BUCKETS]
+    ).sort(CUBE_KEYS)
+
+
+def rollup_party_cube(cube: pl.LazyFrame, State_Selected, Year_Selected) -> pl.LazyFrame:
+    # Same columns as the old cases_agg_2022: Party, candidates_count,
+    # total_criminal_cases, avg_cases - plus money sums and bucket counts
+    return cube.filter((pl.col('State') == State_Selected) &
+                       (pl.col('Year').is_in(Year_Selected))
+        ).groupby('Party').agg(
+            [pl.col('candidates_count').sum(),
+             pl.col('total_criminal_cases').sum()] +
+            [pl.col(name).sum() for name in MONEY_COLUMNS + BUCKET_COLUMNS]
+        ).with_columns(
+            (pl.col('total_criminal_cases') / pl.col('candidates_count')).alias('avg_cases')
+        ).sort(by=['total_criminal_cases', 'Party'], descending=[True, False])
+
+
+def top_parties(party_agg: pl.DataFrame, n=6) -> list:
+    return (
+        party_agg
+        .filter(pl.col('total_criminal_cases') > 0)
+        .head(n)
+        .get_column('Party')
+        .to_list()
+    )
+
+############### Party Cube Ends ###############
+
+
+
+
+############### National Summary ###############
+
+# Fixed size (Party, State) summary of the all India candidate file: how many candidates
+# fall in each case bucket plus the distribution of the cases of those with any case.
+# The all India view is drawn from it instead of one marker per candidate.
+
+NATIONAL_KEYS = ['Party', 'State']
+
+
+def build_national_summary(df: pl.LazyFrame) -> pl.LazyFrame:
+    cases = pl.col('Criminal_Case').filter(pl.col('Criminal_Case') > 0)
+
+    return df.groupby(NATIONAL_KEYS).agg(
+        [
+        pl.col('Party').count().cast(pl.UInt32).alias('candidates_count'),
+        cases.count().cast(pl.UInt32).alias('with_cases'),
+        pl.col('Criminal_Case').sum().cast(pl.Int64).alias('total_criminal_cases'),
+        cases.min().alias('min_cases'),
+        cases.quantile(0.25, 'linear').alias('q25_cases'),
+        cases.median().alias('median_cases'),
+        cases.quantile(0.75, 'linear').alias('q75_cases'),
+        cases.quantile(0.9, 'linear').alias('q90_cases'),
+        pl.col('Criminal_Case').max().alias('max_cases'),
+        ] + [_bucket_expr(*bucket) for bucket in CASE_BUCKETS]
+    ).sort(NATIONAL_KEYS)
+
+############### National Summary Ends ###############
+
+
+
+
+############### Constituency Index ###############
+
+# Partitions are stored sorted by Constituency, so the candidates of one constituency
+# are a contiguous row range of their (State, Year) partition. The index keeps that
+# range (offset, length) with the constituency totals: a drill-down is a slice of the
+# memory mapped partition and constituency totals are a lookup, neither scans the State.
+
+INDEX_KEYS = ['State', 'Year', 'Constituency']
+
+
+def sort_partition(df: pl.DataFrame) -> pl.DataFrame:
+    # alphabetical (not categorical code) order, candidates without a constituency last
+    return df.sort(by=[pl.col('Constituency').cast(pl.Utf8), pl.col('Candidate')], nulls_last=True)
+
+
+def build_constituency_index(partition: pl.DataFrame) -> pl.DataFrame:
+    # partition as written by data_build, i.e. passed through sort_partition
+    return partition.with_row_count('row').filter(pl.col('Constituency').is_not_null()
+        ).groupby(INDEX_KEYS, maintain_order=True).agg(
+            [
+            pl.col('row').min().alias('offset'),
+            pl.count().cast(pl.UInt32).alias('length'),
+            pl.col('Criminal_Case').sum().cast(pl.Int64).alias('total_criminal_cases'),
+            pl.col('Total_Assets').sum().alias('Total_Assets'),
+            ]
+        )
+
+############### Constituency Index Ends ###############
+
+
+
+
+############### Trends ###############
+
+# Year over year change of every party (from the party cube) and every constituency
+# (from the constituency index) of a State: each election is compared with the previous
+# election of the same State. The rows of one election only depend on that election and
+# the one before it, so an appended year computes its own rows (and those of the next
+# election when it was filled in between) and keeps every other row as it is.
+
+TREND_MEASURES = ['candidates_count', 'total_criminal_cases', 'Total_Assets']
+
+
+def election_pairs(rollup: pl.DataFrame) -> pl.DataFrame:
+    # State, Year, prev_Year - one row per election of the rollup that has a previous one
+    return rollup.select(['State', 'Year']).unique().sort(by=['State', 'Year']).with_columns(
+                pl.col('Year').shift(1).over('State').alias('prev_Year')
+            ).filter(pl.col('prev_Year').is_not_null())
+
+
+def build_trends(rollup: pl.LazyFrame, key, pairs: pl.DataFrame) -> pl.LazyFrame:
+    # rows of the current election for every (State, Year) of pairs, with the measures of
+    # the previous election (0 for a newcomer) and the change between the two
+    measures = [pl.col('candidates_count').cast(pl.Int64),
+                pl.col('total_criminal_cases').cast(pl.Int64),
+                pl.col('Total_Assets')]
+
+    rollup = rollup.select(['State', 'Year', key] + measures)
+
+    previous = rollup.join(pairs.lazy().select(['State', pl.col('prev_Year').alias('Year')]).unique(),
+                           on=['State', 'Year'], how='semi'
+                    ).rename({'Year': 'prev_Year', **{name: f'prev_{name}' for name in TREND_MEASURES}})
+
+    return rollup.join(pairs.lazy(), on=['State', 'Year']
+        ).join(previous, on=['State', 'prev_Year', key], how='left'
+        ).with_columns(
+            [pl.col(f'prev_{name}').fill_null(0) for name in TREND_MEASURES]
+        ).with_columns(
+            [(pl.col(name) - pl.col(f'prev_{name}')).alias(f'{name}_delta') for name in TREND_MEASURES]
+        ).select(['State', 'Year', 'prev_Year', key] +
+                 [f'{prefix}{name}' for name in TREND_MEASURES for prefix in ['', 'prev_']] +
+                 [f'{name}_delta' for name in TREND_MEASURES]
+        ).sort(['State', 'Year', key])
+
+############### Trends Ends ###############
@@ -0,0 +1,328 @@
+import abc
+import argparse
+import asyncio
+import io
+import json
+
+import polars as pl
+import pyarrow as pa
+import tornado.ioloop
+import tornado.web
+
+import query_engine as qe
+from export import EXPORT_FORMATS, EXPORT_TABLES, export_bytes, export_filename
+from instrumentation import metrics, trace
+from result_cache import ResultCache
+
+
+############################## API SERVER ##############################
+
+# Headless HTTP API serving the same aggregates as the dashboard, straight from the
+# query engine's in-memory dataset. Async tornado (already installed with streamlit),
+# queries run on a thread pool (polars releases the GIL) and results are kept in a
+# process wide LRU cache, so repeated requests never touch the data again.
+#
+#   python api_server.py --port 8600
+#
+#   GET /api/states
+#   GET /api/years?state=Delhi
+#   GET /api/party_summary?state=Delhi&years=2020,2025
+#   GET /api/major_parties?state=Delhi&years=2025&n=6
+#   GET /api/constituencies?state=Delhi&years=2025[&parties=AAP,BJP | &top=6]
+#   GET /api/assets?state=Delhi[&n=18]
+#   GET /api/trends?state=Delhi&years=2025[&level=party|constituency]
+#   GET /api/search?q=kejriwal[&n=20]
+#   GET /api/export?table=candidates&format=csv|parquet|arrow[&state=Delhi&years=2020,2025]
+#       table: candidates (every state and year without `state`), party_summary,
+#       constituencies, party_trends, constituency_trends
+#   GET /metrics
+#
+# years defaults to the latest election of the state, `years=all` selects every year.
+# Frames are streamed as JSON rows, or as Arrow IPC stream with `format=arrow` or an
+# `Accept: application/vnd.apache.arrow.stream` header.
+
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+
+# rows per streamed chunk
+CHUNK_ROWS = 5000
+
+api_cache = ResultCache(max_bytes=128 * 2**20)
+
+
+class BaseHandler(tornado.web.RequestHandler):
+
+    def write_error(self, status_code, **kwargs):
+        self.set_header('Content-Type', 'application/json')
+        self.finish(json.dumps({'error': self._reason}))
+
+    def state_arg(self):
+        State = self.get_argument('state')
+        if State not in qe.states():
+            raise tornado.web.HTTPError(404, reason=f'Unknown state: {State}')
+
+        return State
+
+    def int_arg(self, name, default):
+        arg = self.get_argument(name, None)
+        if arg is None:
+            return default
+
+        try:
+            return int(arg)
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason=f'Invalid {name}: {arg}')
+
+    def years_arg(self, State):
+        Year_List = qe.years(State)
+
+        arg = self.get_argument('years', None)
+        if arg is None:
+            return Year_List[-1:]
+        if arg == 'all':
+            return Year_List
+
+        try:
+            Years = sorted({int(year) for year in arg.split(',')})
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason=f'Invalid years: {arg}')
+
+        missing = [year for year in Years if year not in Year_List]
+        if missing:
+            raise tornado.web.HTTPError(404, reason=f'No {State} election in {missing}')
+
+        return Years
+
+
+class FrameHandler(BaseHandler, abc.ABC):
+    # subclasses set name and implement query(), returning a polars frame
+
+    name = None
+
+    def params(self) -> dict:
+        return {}
+
+    @abc.abstractmethod
+    def query(self, **params) -> pl.DataFrame:
+        ...
+
+    def _run_query(self, params) -> pl.DataFrame:
+        with trace(f'api.{self.name}', State=params.get('State', '')):
+            return self.query(**params)
+
+    async def get(self):
+        params = self.params()
+        key = (self.name, qe.version(params.get('State'))) + tuple(sorted((k, str(v)) for k, v in params.items()))
+
+        frame = api_cache.get(key)
+        if frame is None:
+            frame = await tornado.ioloop.IOLoop.current().run_in_executor(None, self._run_query, params)
+            api_cache.put(key, frame)
+
+        if self.get_argument('format', None) == 'arrow' or ARROW_STREAM in self.request.headers.get('Accept', ''):
+            await self.stream_arrow(frame)
+        else:
+            await self.stream_json(frame)
+
+    async def stream_json(self, frame: pl.DataFrame):
+        self.set_header('Content-Type', 'application/json')
+        frame = frame.with_columns(pl.col(pl.Categorical).cast(pl.Utf8))
+
+        self.write('[')
+        for offset in range(0, frame.height, CHUNK_ROWS):
+            rows = frame.slice(offset, CHUNK_ROWS).write_json(row_oriented=True)
+            self.write((',' if offset else '') + rows[1:-1])
+            await self.flush()
+        self.finish(']')
+
+    async def stream_arrow(self, frame: pl.DataFrame):
+        self.set_header('Content-Type', ARROW_STREAM)
+
+        table = frame.to_arrow()
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            for batch in table.to_batches(max_chunksize=CHUNK_ROWS):
+                writer.write_batch(batch)
+                self.write(sink.getvalue())
+                sink.seek(0)
+                sink.truncate()
+                await self.flush()
+
+        # end of stream marker written on close
+        self.finish(sink.getvalue())
+
+
+
+############################## ENDPOINTS ##############################
+
+class StatesHandler(BaseHandler):
+
+    def get(self):
+        self.write({'states': qe.states()})
+
+
+class YearsHandler(BaseHandler):
+
+    def get(self):
+        State = self.state_arg()
+        self.write({'state': State, 'years': qe.years(State)})
+
+
+class PartySummaryHandler(FrameHandler):
+    # cases_agg of the dashboard: candidates, total and average cases per party
+    name = 'party_summary'
+
+    def params(self):
+        State = self.state_arg()
+        return {'State': State, 'Years': self.years_arg(State)}
+
+    def query(self, State, Years):
+        return qe.party_summary(State, Years)
+
+
+class MajorPartiesHandler(FrameHandler):
+    name = 'major_parties'
+
+    def params(self):
+        State = self.state_arg()
+        return {'State': State, 'Years': self.years_arg(State), 'n': self.int_arg('n', 6)}
+
+    def query(self, State, Years, n):
+        return qe.major_parties(State, Years, n=n)
+
+
+class ConstituenciesHandler(FrameHandler):
+    # criminal case sums per (Constituency, Party), all parties or the top ones
+    name = 'constituencies'
+
+    def params(self):
+        State = self.state_arg()
+        return {'State': State, 'Years': self.years_arg(State),
+                'parties': self.get_argument('parties', ''), 'top': self.int_arg('top', 0)}
+
+    def query(self, State, Years, parties, top):
+        if top:
+            parties = qe.major_parties(State, Years, n=top).get_column('Party').to_list()
+        elif parties:
+            parties = parties.split(',')
+        else:
+            parties = None
+
+        return qe.constituency_breakdown(State, Years, parties)
+
+
+class AssetsHandler(FrameHandler):
+    # party asset sums (in crore) per election year of the state
+    name = 'assets'
+
+    def params(self):
+        return {'State': self.state_arg(), 'n': self.int_arg('n', 18)}
+
+    def query(self, State, n):
+        return qe.asset_by_year(State, n=n)
+
+
+class TrendsHandler(FrameHandler):
+    # change of each party (or constituency) since the previous election of the state
+    name = 'trends'
+
+    def params(self):
+        State = self.state_arg()
+        level = self.get_argument('level', 'party')
+        if level not in ('party', 'constituency'):
+            raise tornado.web.HTTPError(400, reason=f'Invalid level: {level}')
+
+        return {'State': State, 'Years': self.years_arg(State), 'level': level}
+
+    def query(self, State, Years, level):
+        if level == 'constituency':
+            return qe.constituency_trends(State, Years)
+
+        return qe.party_trends(State, Years)
+
+
+class SearchHandler(FrameHandler):
+    # candidates of every state and year by name, best matching names first
+    name = 'search'
+
+    def params(self):
+        return {'query': self.get_argument('q'), 'n': self.int_arg('n', 20)}
+
+    def query(self, query, n):
+        return qe.search_candidates(query, limit=n)
+
+
+class ExportHandler(BaseHandler):
+    # a file download, encoded chunk by chunk on the thread pool and flushed to the client
+    # as it is produced (never cached, never held in memory as a whole)
+
+    async def get(self):
+        table = self.get_argument('table', 'candidates')
+        fmt = self.get_argument('format', 'csv')
+        if table not in EXPORT_TABLES:
+            raise tornado.web.HTTPError(404, reason=f'Unknown table: {table}')
+        if fmt not in EXPORT_FORMATS:
+            raise tornado.web.HTTPError(400, reason=f'Invalid format: {fmt}')
+
+        State, Years = None, None
+        if table != 'candidates' or self.get_argument('state', None) is not None:
+            State = self.state_arg()
+            Years = self.years_arg(State)
+
+        self.set_header('Content-Type', EXPORT_FORMATS[fmt][0])
+        self.set_header('Content-Disposition',
+                        f'attachment; filename="{export_filename(table, fmt, State, Years)}"')
+
+        chunks = export_bytes(EXPORT_TABLES[table](State, Years), fmt)
+        loop = tornado.ioloop.IOLoop.current()
+        with trace(f'api.export.{table}', State=State or ''):
+            while (data := await loop.run_in_executor(None, next, chunks, None)) is not None:
+                self.write(data)
+                await self.flush()
+
+        self.finish()
+
+
+class MetricsHandler(BaseHandler):
+
+    def get(self):
+        self.set_header('Content-Type', 'text/plain; version=0.0.4')
+        self.write(metrics.prometheus_text())
+
+
+def make_app() -> tornado.web.Application:
+    return tornado.web.Application([
+        (r'/api/states', StatesHandler),
+        (r'/api/years', YearsHandler),
+        (r'/api/party_summary', PartySummaryHandler),
+        (r'/api/major_parties', MajorPartiesHandler),
+        (r'/api/constituencies', ConstituenciesHandler),
+        (r'/api/assets', AssetsHandler),
+        (r'/api/trends', TrendsHandler),
+        (r'/api/search', SearchHandler),
+        (r'/api/export', ExportHandler),
+        (r'/metrics', MetricsHandler),
+    ])
+
+############################## API SERVER DONE ##############################
+
+
+
+async def serve(port):
+    # dataset loaded before the first request
+    qe.get_dataset()
+
+    make_app().listen(port)
+    print(f'Serving dashboard API on http://localhost:{port}')
+    await asyncio.Event().wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the dashboard aggregates over HTTP')
+    parser.add_argument('--port', default=8600, type=int)
+
+    args = parser.parse_args(argv)
+    asyncio.run(serve(args.port))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+import argparse
+import json
+import resource
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import figures
+import query_engine as qe
+from dataset import BASE_DIR
+
+
+############################## BENCHMARK ##############################
+
+# Replays recorded (State, Years) selections through the same query and figure code the
+# app runs on a rerun, without a streamlit server, and reports per section timings:
+#
+#   data_scan     - collecting the selected partitions on their own
+#   aggregations  - query_engine.selection_frames (cube rollup + batched chart queries)
+#   plot_frames   - decoding the categorical columns of the plotted frames (to_plot_frame)
+#   figures       - trace and figure construction (without plot_frames)
+#   serialize     - figure.to_json(), what the browser receives
+#
+#   python benchmark.py                    # compare against benchmarks/baseline.json
+#   python benchmark.py --save-baseline    # record a new baseline on this machine
+
+BENCH_DIR = BASE_DIR / 'benchmarks'
+SELECTIONS_FILE = BENCH_DIR / 'selections.json'
+BASELINE_FILE = BENCH_DIR / 'baseline.json'
+
+SECTIONS = ['data_scan', 'aggregations', 'plot_frames', 'figures', 'serialize']
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+@contextmanager
+def timed_plot_frames(timings):
+    # figures.py converts every plotted frame through to_plot_frame
+    original = figures.to_plot_frame
+
+    def to_plot_frame(df):
+        start = time.perf_counter()
+        try:
+            return original(df)
+        finally:
+            timings['plot_frames'] += time.perf_counter() - start
+
+    figures.to_plot_frame = to_plot_frame
+    try:
+        yield
+    finally:
+        figures.to_plot_frame = original
+
+
+def load_selections(path=SELECTIONS_FILE) -> list:
+    with open(path) as f:
+        selections = json.load(f)
+
+    # "all" expands to every election year of the state in the current dataset
+    return [(s['State'], qe.years(s['State']) if s['Years'] == 'all' else sorted(s['Years']))
+            for s in selections]
+
+
+def run_selection(State_Selected, Year_Selected) -> dict:
+    timings = dict.fromkeys(SECTIONS, 0.0)
+
+    start = time.perf_counter()
+    rows = qe.scan(State_Selected, Year_Selected).collect().height
+    timings['data_scan'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    frames = qe.selection_frames(State_Selected, Year_Selected)
+    timings['aggregations'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with timed_plot_frames(timings):
+        figs = figures.build_figures(frames, State_Selected, Year_Selected)
+    timings['figures'] = time.perf_counter() - start - timings['plot_frames']
+
+    start = time.perf_counter()
+    payload = sum(len(fig.to_json()) for fig in figs.values())
+    timings['serialize'] = time.perf_counter() - start
+
+    timings['total'] = sum(timings[name] for name in SECTIONS)
+
+    return {'rows': rows, 'payload_bytes': payload, 'timings': timings}
+
+
+def run_benchmark(selections, repeat=3) -> dict:
+    results = {}
+    for State_Selected, Year_Selected in selections:
+        runs = [run_selection(State_Selected, Year_Selected) for _ in range(repeat)]
+
+        # median of the repeats, the first run also pays for warming up plotly/polars
+        results[f'{State_Selected} {Year_Selected}'] = {
+            'rows': runs[0]['rows'],
+            'payload_bytes': runs[0]['payload_bytes'],
+            'timings': {name: statistics.median(run['timings'][name] for run in runs)
+                        for name in SECTIONS + ['total']},
+            'peak_rss_mb': peak_rss_mb(),
+        }
+
+    return {'version': qe.get_dataset().version, 'repeat': repeat,
+            'peak_rss_mb': peak_rss_mb(), 'selections': results}
+
+
+def compare(results, baseline, tolerance) -> list:
+    regressions = []
+    for name, result in results['selections'].items():
+        base = baseline['selections'].get(name)
+        if base is None:
+            continue
+
+        for section, seconds in result['timings'].items():
+            base_seconds = base['timings'].get(section)
+            # sub millisecond sections are too noisy to compare
+            if base_seconds and base_seconds > 1e-3 and seconds > base_seconds * (1 + tolerance):
+                regressions.append(f'{name} {section}: {base_seconds * 1000:.1f} ms -> {seconds * 1000:.1f} ms')
+
+        if result['payload_bytes'] > base['payload_bytes'] * (1 + tolerance):
+            regressions.append(f"{name} payload: {base['payload_bytes']} -> {result['payload_bytes']} bytes")
+
+    if results['peak_rss_mb'] > baseline['peak_rss_mb'] * (1 + tolerance):
+        regressions.append(f"peak RSS: {baseline['peak_rss_mb']:.0f} MB -> {results['peak_rss_mb']:.0f} MB")
+
+    return regressions
+
+
+def print_report(results) -> None:
+    header = f"{'selection':<40}{'rows':>8}{'payload KB':>12}" + ''.join(f'{name:>14}' for name in SECTIONS + ['total'])
+    print(header)
+    print('-' * len(header))
+
+    for name, result in results['selections'].items():
+        print(f"{name:<40}{result['rows']:>8}{result['payload_bytes'] / 1024:>12.0f}" +
+              ''.join(f"{result['timings'][section] * 1000:>11.1f} ms" for section in SECTIONS + ['total']))
+
+    print(f"\npeak RSS: {results['peak_rss_mb']:.0f} MB")
+
+############################## BENCHMARK DONE ##############################
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay dashboard selections and time each section')
+    parser.add_argument('--selections', default=SELECTIONS_FILE, type=Path)
+    parser.add_argument('--baseline', default=BASELINE_FILE, type=Path)
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    parser.add_argument('--repeat', default=3, type=int)
+    parser.add_argument('--tolerance', default=0.25, type=float, help='allowed slowdown vs baseline, 0.25 = 25%%')
+    parser.add_argument('--json', action='store_true', help='print the raw results as json')
+
+    args = parser.parse_args(argv)
+
+    selections = load_selections(args.selections)
+    results = run_benchmark(selections, repeat=args.repeat)
+
+    if args.json:
+        print(json.dumps(results, indent=1))
+    else:
+        print_report(results)
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=1)
+        print(f'Saved baseline to {args.baseline}')
+
+    elif args.baseline.exists():
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+        if regressions:
+            print('\nRegressions against baseline:')
+            print('\n'.join(f'  {line}' for line in regressions))
+            return 1
+
+        print('\nNo regressions against baseline')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,352 @@
+import argparse
+import datetime as dt
+import json
+import os
+import shutil
+from pathlib import Path
+
+import polars as pl
+
+from aggregates import (CUBE_KEYS, build_party_cube, build_national_summary,
+                        build_constituency_index, sort_partition, election_pairs, build_trends)
+from dataset import (SOURCE_FILE, DATASET_DIR, MANIFEST_FILE, PARTY_CUBE_FILE, CONSTITUENCY_INDEX_FILE,
+                     PARTY_TRENDS_FILE, CONSTITUENCY_TRENDS_FILE, NAME_INDEX_FILE, TRIGRAM_INDEX_FILE,
+                     LAYOUT_VERSION, SCHEMA,
+                     NATIONAL_CSV, NATIONAL_DIR, NATIONAL_MANIFEST_FILE, NATIONAL_SUMMARY_FILE,
+                     apply_schema, build_lock, partition_path, read_manifest)
+from entity_resolution import RESOLVE_COLUMNS, resolve_persons
+from name_search import build_name_index, write_arrow_table
+
+
+############### Data Build ###############
+
+# Offline step that turns the compiled elections parquet into the partitioned Arrow
+# layout read by the app (see dataset.py) plus the precomputed aggregates.
+#
+#   python data_build.py build [--source Elections_Data_Compiled_latest_2025.parquet]
+#   python data_build.py append --source new_election.parquet [--replace]
+#   python data_build.py convert-csv [--source For_Analysis_in_R.csv]
+
+# small row groups keep the per column statistics useful inside the national parquet files
+ROW_GROUP_SIZE = 2048
+
+
+def new_version() -> str:
+    return dt.datetime.now(dt.timezone.utc).strftime('%Y%m%d%H%M%S%f')
+
+
+def write_partition(df: pl.DataFrame, out_dir: Path, State, Year, version=None) -> dict:
+    path = partition_path(State, Year)
+    (out_dir / path).parent.mkdir(parents=True, exist_ok=True)
+
+    # written aside and renamed, readers of a replaced partition never see half a file
+    # and processes that still map the old file keep reading the old inode
+    tmp_file = (out_dir / path).with_suffix('.tmp')
+    df.write_ipc(tmp_file, compression='uncompressed')
+    os.replace(tmp_file, out_dir / path)
+
+    return {'State': State, 'Year': Year, 'path': path, 'rows': df.height, 'version': version}
+
+
+def write_manifest(partitions, out_dir: Path, version=None) -> dict:
+    version = version or new_version()
+
+    offset = 0
+    for p in partitions:
+        p['offset'] = offset
+        p['version'] = p.get('version') or version
+        offset += p['rows']
+
+    manifest = {'version': version,
+                'layout': LAYOUT_VERSION,
+                'rows': offset,
+                'partitions': partitions}
+
+    # the manifest is swapped in last, it is what makes a change visible to the app
+    tmp_file = out_dir / (MANIFEST_FILE.name + '.tmp')
+    with open(tmp_file, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_file, out_dir / MANIFEST_FILE.name)
+
+    return manifest
+
+
+def write_party_cube(cube: pl.DataFrame) -> None:
+    tmp_file = PARTY_CUBE_FILE.with_suffix('.tmp')
+    cube.write_ipc(tmp_file, compression='uncompressed')
+    os.replace(tmp_file, PARTY_CUBE_FILE)
+
+
+def write_constituency_index(index: pl.DataFrame, out_dir: Path) -> None:
+    tmp_file = out_dir / (CONSTITUENCY_INDEX_FILE.name + '.tmp')
+    index.write_ipc(tmp_file, compression='uncompressed')
+    os.replace(tmp_file, out_dir / CONSTITUENCY_INDEX_FILE.name)
+
+
+def write_name_index(partitions, out_dir: Path) -> None:
+    # global row ids follow the order of the partitions, i.e. of the manifest written next
+    candidates = pl.concat([pl.scan_ipc(out_dir / p['path'], memory_map=True).select('Candidate')
+                            for p in partitions]).collect().get_column('Candidate')
+
+    for table, path in zip(build_name_index(candidates), [NAME_INDEX_FILE, TRIGRAM_INDEX_FILE]):
+        tmp_file = out_dir / (path.name + '.tmp')
+        write_arrow_table(table, tmp_file)
+        os.replace(tmp_file, out_dir / path.name)
+
+
+def write_trends(cube: pl.DataFrame, index: pl.DataFrame, State=None, Year=None) -> None:
+    # every election on a build, after an append only the elections compared with the
+    # appended (State, Year): itself and the next election of the State
+    pairs = election_pairs(cube)
+    if State is not None:
+        pairs = pairs.filter((pl.col('State') == State) &
+                             ((pl.col('Year') == Year) | (pl.col('prev_Year') == Year)))
+
+    rollups = [(cube, 'Party', PARTY_TRENDS_FILE),
+               (index.rename({'length': 'candidates_count'}), 'Constituency', CONSTITUENCY_TRENDS_FILE)]
+
+    for rollup, key, path in rollups:
+        trends = build_trends(rollup.lazy(), key, pairs).collect()
+
+        if State is not None:
+            kept = pl.read_ipc(path, memory_map=False).join(pairs.select(['State', 'Year']),
+                                                             on=['State', 'Year'], how='anti')
+            trends = pl.concat([kept, trends]).sort(['State', 'Year', key])
+
+        tmp_file = path.with_suffix('.tmp')
+        trends.write_ipc(tmp_file, compression='uncompressed')
+        os.replace(tmp_file, path)
+
+
+def build_dataset(source=SOURCE_FILE, processes=1) -> dict:
+    # processes > 1 resolves the States on a spawned process pool, which re-imports
+    # __main__: only from the CLI, not from an app or script building on first start
+    df = pl.scan_parquet(source).pipe(apply_schema).collect().sort(['State', 'Year'])
+    df = df.with_columns(resolve_persons(df, processes))
+
+    # written next to the live layout and swapped in at the end so running
+    # apps never see a half written dataset
+    tmp_dir = DATASET_DIR.with_name(DATASET_DIR.name + '.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    partitions, index = [], []
+    for part in df.partition_by(['State', 'Year'], maintain_order=True):
+        part = sort_partition(part)
+        partitions.append(write_partition(part, tmp_dir, part[0, 'State'], part[0, 'Year']))
+        index.append(build_constituency_index(part))
+
+    index = pl.concat(index)
+    write_constituency_index(index, tmp_dir)
+    write_name_index(partitions, tmp_dir)
+    manifest = write_manifest(partitions, tmp_dir)
+
+    cube = build_party_cube(df.lazy()).collect()
+    write_party_cube(cube)
+    write_trends(cube, index)
+
+    old_dir = DATASET_DIR.with_name(DATASET_DIR.name + '.old')
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if DATASET_DIR.exists():
+        DATASET_DIR.rename(old_dir)
+    tmp_dir.rename(DATASET_DIR)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+    return manifest
+
+############### Data Build Ends ###############
+
+
+
+
+############### Append ###############
+
+# Adds one new (State, Year) election to the live layout without a rebuild: the batch is
+# validated against the schema, its candidates get the person_id of their earlier elections
+# and it is written as its own partition, only the cube, index and trend rows of that
+# (State, Year) are recomputed and a new manifest (with the new State/Year in the
+# option lists) is swapped in last. Running apps notice the new manifest and reload.
+
+
+def scan_source(source: Path) -> pl.LazyFrame:
+    if source.suffix == '.csv':
+        return pl.scan_csv(source)
+
+    return pl.scan_parquet(source)
+
+
+def validate_batch(lf: pl.LazyFrame) -> pl.DataFrame:
+    missing = [name for name in SCHEMA if name not in lf.columns]
+    if missing:
+        raise ValueError(f'Batch is missing columns: {missing}')
+
+    try:
+        df = lf.pipe(apply_schema).collect()
+    except pl.ComputeError as e:
+        raise ValueError(f'Batch does not match the schema: {e}') from None
+
+    if df.is_empty():
+        raise ValueError('Batch has no rows')
+
+    for name in ['State', 'Year', 'Party', 'Criminal_Case', 'Total_Assets', 'Liabilities']:
+        if df.get_column(name).null_count():
+            raise ValueError(f'Batch has empty {name} values')
+
+    elections = df.select(['State', 'Year']).unique()
+    if elections.height != 1:
+        raise ValueError(f'Batch must hold a single (State, Year), found {elections.height}')
+
+    return df
+
+
+def append_partition(source, replace=False) -> dict:
+    df = validate_batch(scan_source(Path(source))).pipe(sort_partition)
+    State, Year = df[0, 'State'], df[0, 'Year']
+
+    manifest = read_manifest()
+    partitions = [p for p in manifest['partitions'] if (p['State'], p['Year']) != (State, Year)]
+
+    if len(partitions) != len(manifest['partitions']) and not replace:
+        raise ValueError(f'{State} {Year} is already in the dataset, use --replace to overwrite it')
+
+    # resolved together with the other years of the State, whose rows keep their person_id
+    known = [pl.scan_ipc(DATASET_DIR / p['path'], memory_map=True).select(RESOLVE_COLUMNS + ['person_id'])
+             for p in partitions if p['State'] == State]
+    batch = df.select(RESOLVE_COLUMNS).with_columns(pl.lit(None, pl.Int64).alias('person_id'))
+    person_ids = resolve_persons(pl.concat(known + [batch.lazy()]).collect(), processes=1)
+    df = df.with_columns(person_ids.tail(df.height))
+
+    version = new_version()
+    partitions.append(write_partition(df, DATASET_DIR, State, Year, version))
+    partitions.sort(key=lambda p: (p['State'], p['Year']))
+
+    # only the cube rows of the new (State, Year) are computed
+    cube = pl.read_ipc(PARTY_CUBE_FILE, memory_map=False).filter(
+                    ~((pl.col('State') == State) & (pl.col('Year') == Year)))
+    cube = pl.concat([cube, build_party_cube(df.lazy()).collect()]).sort(CUBE_KEYS)
+    write_party_cube(cube)
+
+    # ... only its constituency index rows
+    index = pl.read_ipc(CONSTITUENCY_INDEX_FILE, memory_map=False).filter(
+                    ~((pl.col('State') == State) & (pl.col('Year') == Year)))
+    index = pl.concat([index, build_constituency_index(df)])
+    write_constituency_index(index, DATASET_DIR)
+
+    # ... and only the trend rows of the elections compared with it
+    write_trends(cube, index, State, Year)
+
+    # row ids of the later partitions move, the (small) name index is rebuilt
+    write_name_index(partitions, DATASET_DIR)
+
+    return write_manifest(partitions, DATASET_DIR, version)
+
+############### Append Ends ###############
+
+
+
+
+############### CSV Conversion ###############
+
+# Streams a candidate csv of any size into parquet part files: the csv is read in
+# batches of about CSV_BATCH_ROWS rows, every batch gets the strict schema (money strings
+# parsed) and is written out before the next one is read, so memory stays bounded by
+# the batch size and not by the file.
+
+CSV_BATCH_ROWS = 100_000
+
+
+def convert_csv(source=NATIONAL_CSV, out_dir=NATIONAL_DIR, batch_rows=CSV_BATCH_ROWS) -> dict:
+    # every column read as text, the casts of apply_schema decide what is valid
+    reader = pl.read_csv_batched(source, dtypes={name: pl.Utf8 for name in SCHEMA},
+                                 batch_size=batch_rows)
+
+    tmp_dir = out_dir.with_name(out_dir.name + '.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    files, rows = [], 0
+    while True:
+        batches = reader.next_batches(1)
+        if not batches:
+            break
+
+        batch = batches[0]
+        missing = [name for name in SCHEMA if name not in batch.columns]
+        if missing:
+            raise ValueError(f'{source} is missing columns: {missing}')
+
+        try:
+            batch = batch.lazy().pipe(apply_schema).collect()
+        except pl.ComputeError as e:
+            raise ValueError(f'{source} rows {rows}-{rows + batch.height} do not match the schema: {e}') from None
+
+        name = f'part-{len(files):05d}.parquet'
+        batch.write_parquet(tmp_dir / name, statistics=True, row_group_size=ROW_GROUP_SIZE)
+        files.append(name)
+        rows += batch.height
+
+    # one more streaming pass over the parts, the summary has a row per (Party, State)
+    national = pl.concat([pl.scan_parquet(tmp_dir / name) for name in files], how='vertical', rechunk=False)
+    build_national_summary(national).collect(streaming=True
+                                    ).write_parquet(tmp_dir / NATIONAL_SUMMARY_FILE.name)
+
+    manifest = {'version': new_version(), 'layout': LAYOUT_VERSION, 'source': Path(source).name,
+                'rows': rows, 'files': files}
+    with open(tmp_dir / NATIONAL_MANIFEST_FILE.name, 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    tmp_dir.rename(out_dir)
+
+    return manifest
+
+############### CSV Conversion Ends ###############
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the partitioned elections dataset')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help='rewrite the source parquet as State/Year partitions')
+    build.add_argument('--source', default=SOURCE_FILE, type=Path)
+    build.add_argument('--processes', default=os.cpu_count() or 1, type=int,
+                       help='States resolved in parallel (entity resolution)')
+
+    append = commands.add_parser('append', help='add one (State, Year) election as a new partition')
+    append.add_argument('--source', required=True, type=Path, help='parquet or csv with the source columns')
+    append.add_argument('--replace', action='store_true', help='overwrite the partition if it exists')
+
+    convert = commands.add_parser('convert-csv', help='stream the all India candidate csv into parquet')
+    convert.add_argument('--source', default=NATIONAL_CSV, type=Path)
+    convert.add_argument('--batch-rows', default=CSV_BATCH_ROWS, type=int)
+
+    args = parser.parse_args(argv)
+
+    # never at the same time as a worker building on its first start
+    with build_lock():
+        if args.command == 'build':
+            manifest = build_dataset(args.source, args.processes)
+            print(f"Wrote {len(manifest['partitions'])} partitions, {manifest['rows']} rows "
+                  f"to {DATASET_DIR} (version {manifest['version']})")
+
+        elif args.command == 'append':
+            try:
+                manifest = append_partition(args.source, args.replace)
+            except ValueError as e:
+                parser.exit(1, f'append failed: {e}\n')
+
+            print(f"Appended {args.source} to {DATASET_DIR}, {manifest['rows']} rows "
+                  f"(version {manifest['version']})")
+
+        elif args.command == 'convert-csv':
+            try:
+                manifest = convert_csv(args.source, batch_rows=args.batch_rows)
+            except ValueError as e:
+                parser.exit(1, f'convert-csv failed: {e}\n')
+
+            print(f"Wrote {len(manifest['files'])} parquet files, {manifest['rows']} rows to {NATIONAL_DIR}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,333 @@
+import bisect
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import polars as pl
+
+
+############### Dataset Layout ###############
+
+# The candidate data is stored hive style, one partition per State and Year:
+#
+#   data/elections/State=Delhi/Year=2025/part-0.arrow
+#   data/elections/manifest.json
+#
+# Partitions and the party cube are uncompressed Arrow IPC files that every process
+# memory maps read-only: the OS page cache holds one copy of the data for all streamlit
+# workers on the machine, and starting a worker parses nothing.
+#
+# The manifest lists every partition with its row count, so state/year lists
+# and partition pruning are a lookup and only the selected partitions get scanned.
+# The layout is written by `python data_build.py build`, new elections are added
+# with `python data_build.py append`.
+#
+# The manifest `version` changes with every build or append, each partition keeps the
+# version it was written with, so a State's aggregates only go stale when one of its
+# own partitions changed.
+
+BASE_DIR = Path(__file__).resolve().parent
+
+SOURCE_FILE = BASE_DIR / 'Elections_Data_Compiled_latest_2025.parquet'
+
+DATA_DIR = BASE_DIR / 'data'
+DATASET_DIR = DATA_DIR / 'elections'
+MANIFEST_FILE = DATASET_DIR / 'manifest.json'
+CONSTITUENCY_INDEX_FILE = DATASET_DIR / 'constituency_index.arrow'
+NAME_INDEX_FILE = DATASET_DIR / 'name_index.arrow'
+TRIGRAM_INDEX_FILE = DATASET_DIR / 'trigram_index.arrow'
+PARTY_CUBE_FILE = DATA_DIR / 'party_cube.arrow'
+PARTY_TRENDS_FILE = DATA_DIR / 'party_trends.arrow'
+CONSTITUENCY_TRENDS_FILE = DATA_DIR / 'constituency_trends.arrow'
+
+PARTITION_FILE = 'part-0.arrow'
+
+# latest election of every State, the all India views read the converted copy
+NATIONAL_CSV = BASE_DIR / 'For_Analysis_in_R.csv'
+NATIONAL_DIR = DATA_DIR / 'national'
+NATIONAL_MANIFEST_FILE = NATIONAL_DIR / 'manifest.json'
+NATIONAL_SUMMARY_FILE = NATIONAL_DIR / 'party_state_summary.parquet'
+
+# held by whoever builds, appends or converts (see build_lock)
+BUILD_LOCK_FILE = DATA_DIR / '.build.lock'
+
+# bumped whenever the stored columns change, an older layout on disk is rebuilt
+LAYOUT_VERSION = 10
+
+############### Dataset Layout Ends ###############
+
+
+
+############### Schema ###############
+
+# Compact schema written at build time. The heavily repeated strings are dictionary
+# encoded (Categorical), so filters, is_in() and group-bys compare u32 codes instead of
+# hashing full strings. One global string cache keeps the codes of all partitions
+# (and of the cube) compatible when they are concatenated or joined.
+
+pl.enable_string_cache(True)
+
+SCHEMA = {
+    'State': pl.Categorical,
+    'Year': pl.Int16,
+    'Candidate': pl.Utf8,
+    'Constituency': pl.Categorical,
+    'Party': pl.Categorical,
+    'Criminal_Case': pl.UInt16,
+    'Education': pl.Categorical,
+    'Total_Assets': pl.Float64,
+    'Liabilities': pl.Int64,
+}
+
+CRORE = 10**7
+
+
+def parse_rupees(column) -> pl.Expr:
+    # "Rs 44,00,000" (lakh/crore digit grouping, sometimes followed by "~ 44 Lacs+")
+    # -> 4400000 rupees, a value without any digit fails the strict cast
+    return pl.col(column).str.extract(r'^([^~]*)', 1
+                        ).str.replace_all(r'[^0-9]', ''
+                        ).cast(pl.Int64, strict=True).alias(column)
+
+
+# computed once at build time so no query parses or rescales money per request
+DERIVED_COLUMNS = [
+    (pl.col('Total_Assets') - pl.col('Liabilities')).alias('Net_Worth'),
+    (pl.col('Total_Assets') / CRORE).alias('Total_Assets_Cr'),
+    (pl.col('Liabilities') / CRORE).alias('Liabilities_Cr'),
+    ((pl.col('Total_Assets') - pl.col('Liabilities')) / CRORE).alias('Net_Worth_Cr'),
+]
+
+
+def apply_schema(lf: pl.LazyFrame) -> pl.LazyFrame:
+    # money strings of the scraped sources are parsed into integer rupees first
+    if lf.schema['Liabilities'] == pl.Utf8:
+        lf = lf.with_columns(parse_rupees('Liabilities'))
+
+    # strict casts, a value that does not fit (e.g. negative cases) fails the build
+    return lf.select([pl.col(name).cast(dtype, strict=True) for name, dtype in SCHEMA.items()]
+                     ).with_columns(DERIVED_COLUMNS)
+
+############### Schema Ends ###############
+
+
+
+############### Partitions ###############
+
+
+def partition_path(State, Year) -> str:
+    return f'State={State}/Year={Year}/{PARTITION_FILE}'
+
+
+# Streamlit workers started together on a fresh checkout would all build the layout into
+# the same temp directory. The build runs under an exclusive lock on BUILD_LOCK_FILE (held
+# by the data_build CLI too), the workers that waited find the layout built.
+
+_build_thread_lock = threading.RLock()
+_build_depth = 0
+
+
+@contextmanager
+def build_lock():
+    # exclusive across processes and threads, reentrant in the thread holding it
+    global _build_depth
+
+    with _build_thread_lock:
+        if _build_depth == 0:
+            DATA_DIR.mkdir(parents=True, exist_ok=True)
+            lock_file = open(BUILD_LOCK_FILE, 'w')
+            _lock_file(lock_file)
+
+        _build_depth += 1
+        try:
+            yield
+        finally:
+            _build_depth -= 1
+            if _build_depth == 0:
+                # closing the file releases the lock
+                lock_file.close()
+
+
+def _lock_file(f) -> None:
+    if os.name == 'nt':
+        import msvcrt
+
+        # LK_LOCK gives up after about 10 seconds, a build takes longer
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+
+    import fcntl
+    fcntl.flock(f, fcntl.LOCK_EX)
+
+
+def layout_current(manifest_file) -> bool:
+    if not manifest_file.exists():
+        return False
+
+    with open(manifest_file) as f:
+        return json.load(f).get('layout') == LAYOUT_VERSION
+
+
+def ensure_dataset() -> None:
+    # first start of a fresh checkout (or a layout written by an older version of
+    # the code), build the layout from the source parquet
+    if layout_current(MANIFEST_FILE):
+        return
+
+    with build_lock():
+        # built by another worker while this one waited
+        if layout_current(MANIFEST_FILE):
+            return
+
+        from data_build import build_dataset
+        build_dataset()
+
+
+def manifest_stamp():
+    # cheap change check for running processes, None before the first build
+    try:
+        return MANIFEST_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def read_manifest() -> dict:
+    ensure_dataset()
+
+    with open(MANIFEST_FILE) as f:
+        return json.load(f)
+
+
+def list_states(manifest) -> list:
+    return sorted({p['State'] for p in manifest['partitions']})
+
+
+def list_years(manifest, State) -> list:
+    return sorted(p['Year'] for p in manifest['partitions'] if p['State'] == State)
+
+
+def state_version(manifest, State) -> str:
+    # newest partition of the State, aggregates spanning all of its years depend on it
+    return max(p['version'] for p in manifest['partitions'] if p['State'] == State)
+
+
+def select_partitions(manifest, State=None, Years=None) -> list:
+    return [p for p in manifest['partitions']
+            if (State is None or p['State'] == State) and
+               (Years is None or p['Year'] in Years)]
+
+
+def scan_partitions(partitions, manifest=None) -> pl.LazyFrame:
+    if not partitions:
+        # nothing selected, an empty frame with the dataset schema
+        manifest = manifest or read_manifest()
+        return scan_partitions(manifest['partitions'][:1]).head(0)
+
+    return pl.concat([pl.scan_ipc(DATASET_DIR / p['path'], memory_map=True, rechunk=False)
+                      for p in partitions],
+                     how='vertical', rechunk=False)
+
+
+def read_party_cube() -> pl.DataFrame:
+    return pl.read_ipc(PARTY_CUBE_FILE, memory_map=True, rechunk=False)
+
+
+def read_constituency_index() -> pl.DataFrame:
+    return pl.read_ipc(CONSTITUENCY_INDEX_FILE, memory_map=True, rechunk=False)
+
+
+def read_trends():
+    # (party trends, constituency trends), see aggregates.build_trends
+    return (pl.read_ipc(PARTY_TRENDS_FILE, memory_map=True, rechunk=False),
+            pl.read_ipc(CONSTITUENCY_TRENDS_FILE, memory_map=True, rechunk=False))
+
+
+def read_partition_rows(partition, offset, length) -> pl.DataFrame:
+    # a row range of one memory mapped partition, nothing else of the file is read
+    return pl.scan_ipc(DATASET_DIR / partition['path'], memory_map=True).slice(offset, length).collect()
+
+
+def read_rows(manifest, row_ids) -> pl.DataFrame:
+    # rows by global row id (partition offset + row in the partition) in the given order,
+    # each partition is memory mapped and only the requested rows are gathered
+    partitions = manifest['partitions']
+    offsets = [p['offset'] for p in partitions]
+
+    by_partition = {}
+    for position, row_id in enumerate(row_ids):
+        i = bisect.bisect_right(offsets, row_id) - 1
+        by_partition.setdefault(i, []).append((position, row_id - offsets[i]))
+
+    parts = []
+    for i, rows in by_partition.items():
+        positions, local_rows = zip(*rows)
+        df = pl.read_ipc(DATASET_DIR / partitions[i]['path'], memory_map=True, rechunk=False)
+        parts.append(df[list(local_rows)].with_columns(pl.Series('position', positions, dtype=pl.UInt32)))
+
+    if not parts:
+        return scan_partitions(partitions[:1]).head(0).collect()
+
+    return pl.concat(parts).sort('position').drop('position')
+
+
+def scan_dataset(manifest=None) -> pl.LazyFrame:
+    manifest = manifest or read_manifest()
+    return scan_partitions(manifest['partitions'])
+
+
+def scan_selection(State, Years, manifest=None) -> pl.LazyFrame:
+    manifest = manifest or read_manifest()
+    return scan_partitions(select_partitions(manifest, State, Years), manifest)
+
+############### Partitions Ends ###############
+
+
+
+############### National ###############
+
+# The all India candidate file is converted batch by batch into parquet part files
+# (`python data_build.py convert-csv`), the csv itself is never read by the app. The
+# conversion also writes the (Party, State) summary of aggregates.build_national_summary.
+
+
+def ensure_national() -> None:
+    if layout_current(NATIONAL_MANIFEST_FILE):
+        return
+
+    with build_lock():
+        if layout_current(NATIONAL_MANIFEST_FILE):
+            return
+
+        from data_build import convert_csv
+        convert_csv()
+
+
+def scan_national() -> pl.LazyFrame:
+    ensure_national()
+
+    with open(NATIONAL_MANIFEST_FILE) as f:
+        files = json.load(f)['files']
+
+    return pl.concat([pl.scan_parquet(NATIONAL_DIR / name) for name in files],
+                     how='vertical', rechunk=False)
+
+
+def read_national_summary() -> pl.DataFrame:
+    ensure_national()
+    return pl.read_parquet(NATIONAL_SUMMARY_FILE)
+
+
+def national_version() -> str:
+    # changes on every conversion, cached figures of the national data are keyed on it
+    ensure_national()
+
+    with open(NATIONAL_MANIFEST_FILE) as f:
+        return json.load(f)['version']
+
+############### National Ends ###############
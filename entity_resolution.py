@@ -0,0 +1,175 @@
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import polars as pl
+
+from name_search import fold_name, trigram_codes
+
+
+############################## ENTITY RESOLUTION ##############################
+
+# Offline stage of data_build giving every candidate row a person_id, the same for the
+# rows of one politician across years and constituencies, whatever the spelling.
+#
+#   blocking   - rows are only compared inside a block, never all pairs of a State:
+#                (State, Party, phonetic code of the first name) catches spelling variants
+#                and dropped middle names, (State, phonetic code of the full name) catches
+#                party switchers
+#   scoring    - per block at once: trigram Jaccard similarity of the folded names (one
+#                matrix product) plus agreement of constituency and party. Party agreement
+#                is no evidence for independents, nor for names several candidates of one
+#                election share (the many Sanjay Kumars): those only link in the same seat
+#   clustering - linked pairs are merged best score first, a person never stands twice
+#                in the same election so clusters sharing a Year are not merged
+#
+# The data_build CLI resolves the States in parallel on a process pool. person_id is
+# stable across rebuilds: a hash of the first appearance of the person, or the id its rows
+# already had, and unique per person within the State.
+
+NAME_WEIGHT, CONSTITUENCY_WEIGHT, PARTY_WEIGHT = 0.6, 0.25, 0.15
+# e.g. identical names in the same party, or a spelling variant in the same constituency
+LINK_SCORE = 0.75
+
+RESOLVE_COLUMNS = ['State', 'Year', 'Candidate', 'Party', 'Constituency']
+
+INDEPENDENT = 'IND'
+
+
+def phonetic_code(word) -> str:
+    # consonant skeleton of a folded word: first letter kept, later vowels dropped
+    return word[:1] + ''.join(char for char in word[1:] if char not in 'aeiou')
+
+
+def person_hash(State, Year, Constituency, Party, name, n=0) -> int:
+    # 48 bits, exact as a javascript number in the browser. n > 0 tells apart persons with
+    # the same first appearance
+    key = f'{State}|{Year}|{Constituency}|{Party}|{name}' + (f'|{n}' if n else '')
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=6).digest(), 'big')
+
+
+def block_pairs(rows, trigrams, years, constituencies, parties):
+    # (i, j, score) of the linked pairs among rows (indexes of one block), parties < 0 never agree
+    rows = np.asarray(rows)
+    codes, inverse = np.unique(np.concatenate([trigrams[row] for row in rows]), return_inverse=True)
+
+    # binary (rows, trigrams) matrix, the shared trigrams of every pair are one product
+    names = np.zeros((len(rows), len(codes)), dtype=np.float32)
+    names[np.repeat(np.arange(len(rows)), [len(trigrams[row]) for row in rows]), inverse] = 1
+
+    shared = names @ names.T
+    sizes = names.sum(axis=1)
+    similarity = shared / (sizes[:, None] + sizes[None, :] - shared)
+
+    score = (NAME_WEIGHT * similarity +
+             CONSTITUENCY_WEIGHT * (constituencies[rows][:, None] == constituencies[rows][None, :]) +
+             PARTY_WEIGHT * ((parties[rows][:, None] == parties[rows][None, :]) & (parties[rows] >= 0)[:, None]))
+
+    # each pair once, never two rows of the same election
+    linked = np.triu(score >= LINK_SCORE, k=1) & (years[rows][:, None] != years[rows][None, :])
+    i, j = np.nonzero(linked)
+
+    return rows[i], rows[j], score[i, j]
+
+
+def resolve_state(frame: pl.DataFrame) -> pl.DataFrame:
+    # frame: row_nr + RESOLVE_COLUMNS (plain strings) + person_id (null for new rows) of
+    # one State. Returns row_nr, person_id.
+    names = [fold_name(Candidate) for Candidate in frame.get_column('Candidate')]
+    trigrams = [trigram_codes(name) for name in names]
+
+    years = frame.get_column('Year').to_numpy()
+    constituencies = frame.get_column('Constituency').fill_null('').cast(pl.Categorical).to_physical().to_numpy()
+
+    # party codes, -1 where agreeing on the party says nothing
+    shared_name = pl.DataFrame({'Year': years, 'name': names}).with_columns(
+                        (pl.count().over(['Year', 'name']) > 1).alias('shared')
+                    ).select(pl.col('shared').any().over('name')).to_series()
+    parties = np.where((frame.get_column('Party') == INDEPENDENT).to_numpy() | shared_name.to_numpy(), -1,
+                       frame.get_column('Party').cast(pl.Categorical).to_physical().cast(pl.Int64).to_numpy())
+
+    blocks = pl.DataFrame({
+        'Party': frame.get_column('Party'),
+        'first_code': [phonetic_code(name.split()[0]) if name else '' for name in names],
+        'full_code': [' '.join(phonetic_code(word) for word in name.split()) for name in names],
+    }).with_row_count('row').filter(pl.col('full_code') != '')
+
+    pairs = []
+    for keys in [['Party', 'first_code'], ['full_code']]:
+        for rows in blocks.groupby(keys).agg(pl.col('row')).get_column('row'):
+            if len(rows) > 1:
+                pairs.append(block_pairs(rows.to_numpy(), trigrams, years, constituencies, parties))
+
+    # union find, best linked pairs first
+    parent = list(range(frame.height))
+    cluster_years = [{Year} for Year in years]
+
+    def find(row):
+        while parent[row] != row:
+            parent[row] = parent[parent[row]]
+            row = parent[row]
+        return row
+
+    if pairs:
+        i, j, score = (np.concatenate(column) for column in zip(*pairs))
+        for k in np.argsort(-score, kind='stable'):
+            a, b = find(i[k]), find(j[k])
+            if a != b and not (cluster_years[a] & cluster_years[b]):
+                parent[b] = a
+                cluster_years[a] |= cluster_years[b]
+
+    # the id the rows of a cluster already have, else the hash of its first appearance
+    State = frame[0, 'State']
+    frame = frame.with_columns([pl.Series('name', names),
+                                pl.Series('cluster', [find(row) for row in range(frame.height)])])
+
+    clusters = frame.sort(by=['Year', 'Constituency', 'name', 'row_nr'], nulls_last=True
+                    ).groupby('cluster', maintain_order=True).agg([
+                        pl.col('person_id').min().alias('known_id'),
+                        pl.col(['Year', 'Constituency', 'Party', 'name']).first(),
+                    ])
+
+    # one id per cluster: a known id goes to the first cluster holding it (a rebuild can
+    # split a person), a hash is counted up past the ids already taken (clusters with the
+    # same first appearance, e.g. a row repeated in the source, or a hash collision)
+    taken = set(clusters.get_column('known_id').drop_nulls())
+    claimed, ids = set(), []
+    for known_id, Year, Constituency, Party, name in clusters.select(
+                ['known_id', 'Year', 'Constituency', 'Party', 'name']).iter_rows():
+        person_id, n = known_id, 0
+        while person_id is None or person_id in claimed or (person_id != known_id and person_id in taken):
+            person_id = person_hash(State, Year, Constituency, Party, name, n)
+            n += 1
+
+        claimed.add(person_id)
+        ids.append(person_id)
+
+    person_ids = clusters.select(pl.col('cluster')).with_columns(pl.Series('person_id', ids, dtype=pl.Int64))
+
+    # left join, rows keep their order
+    return frame.select(['row_nr', 'cluster']).join(person_ids, on='cluster', how='left'
+                ).select(['row_nr', 'person_id'])
+
+
+def resolve_persons(df: pl.DataFrame, processes=1) -> pl.Series:
+    # person_id of every row of df (candidate rows of one or more States), in df order.
+    # An existing person_id column is kept for the rows that have one. processes > 1 needs
+    # a __main__ that is safe to import again (if __name__ == '__main__' guarded).
+    frame = df.select(RESOLVE_COLUMNS + (['person_id'] if 'person_id' in df.columns else
+                                         [pl.lit(None, pl.Int64).alias('person_id')])
+                ).with_columns(pl.col(pl.Categorical).cast(pl.Utf8)).with_row_count('row_nr')
+
+    states = frame.partition_by('State', maintain_order=True)
+    processes = min(processes, len(states))
+
+    if processes <= 1:
+        resolved = [resolve_state(state) for state in states]
+    else:
+        # spawned, forking a process that already runs polars threads can deadlock
+        with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+            resolved = list(pool.map(resolve_state, states))
+
+    return pl.concat(resolved).sort('row_nr').get_column('person_id')
+
+############################## ENTITY RESOLUTION DONE ##############################
@@ -0,0 +1,125 @@
+import io
+
+import polars as pl
+import pyarrow as pa
+
+import query_engine as qe
+from dataset import scan_partitions, select_partitions
+
+
+############################## EXPORT ##############################
+
+# The data behind the charts as CSV, Parquet or Arrow IPC stream, written chunk by chunk:
+# candidate rows are sliced out of one memory mapped partition at a time (the slice is
+# pushed down into the scan), aggregates are collected (they are small) and cut into
+# slices. Every chunk is encoded on its own and its bytes handed out before the next one
+# is read, so exporting every State and year holds one chunk in memory, not the dataset,
+# and nothing goes through pandas.
+#
+#   for data in export_bytes(EXPORT_TABLES['candidates'](None, None), 'parquet'): ...
+
+EXPORT_CHUNK_ROWS = 50_000
+
+# format -> (mime type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+
+def candidate_chunks(State=None, Years=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    # candidate rows of the selection, every State and year when State is None
+    manifest = qe.get_dataset().manifest
+    partitions = select_partitions(manifest, State, Years)
+    if not partitions:
+        yield scan_partitions([], manifest).collect()
+
+    for partition in partitions:
+        candidates = scan_partitions([partition])
+        for offset in range(0, partition['rows'], chunk_rows):
+            yield candidates.slice(offset, chunk_rows).collect()
+
+
+def frame_chunks(query: pl.LazyFrame, chunk_rows=EXPORT_CHUNK_ROWS):
+    df = query.collect()
+    if df.is_empty():
+        yield df
+
+    yield from df.iter_slices(chunk_rows)
+
+
+# table -> chunks of the (State, Years) selection, only candidates can export every State
+EXPORT_TABLES = {
+    'candidates': candidate_chunks,
+    'party_summary': lambda State, Years: frame_chunks(qe.party_summary_query(State, Years)),
+    'constituencies': lambda State, Years: frame_chunks(qe.constituency_breakdown_query(qe.scan(State, Years))),
+    'party_trends': lambda State, Years: frame_chunks(qe.party_trends(State, Years).lazy()),
+    'constituency_trends': lambda State, Years: frame_chunks(qe.constituency_trends(State, Years).lazy()),
+}
+
+
+class _ChunkSink(io.RawIOBase):
+    # write only file the encoders write into, drained after every chunk. Keeps its own
+    # position so the parquet footer offsets stay right after the bytes were handed out.
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def export_bytes(chunks, fmt):
+    # the encoded file, one bytes object per chunk (and one for the parquet footer /
+    # arrow end of stream marker)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'Unknown export format: {fmt}')
+
+    # only loaded by processes that export parquet
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = None
+
+    for i, df in enumerate(chunks):
+        # categorical dictionaries differ between chunks, exported as plain strings
+        df = df.with_columns(pl.col(pl.Categorical).cast(pl.Utf8))
+
+        if fmt == 'csv':
+            df.write_csv(sink, has_header=(i == 0))
+        else:
+            table = df.to_arrow()
+            if writer is None:
+                writer = (pq.ParquetWriter(sink, table.schema) if fmt == 'parquet'
+                          else pa.ipc.new_stream(sink, table.schema))
+            writer.write_table(table)
+
+        yield sink.drain()
+
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+def export_filename(table, fmt, State=None, Years=None) -> str:
+    selection = [State or 'all_states'] + ['-'.join(str(Year) for Year in Years) if Years else 'all_years']
+    name = '_'.join([table] + selection).replace(' ', '_')
+    return f'{name}.{EXPORT_FORMATS[fmt][1]}'
+
+############################## EXPORT DONE ##############################
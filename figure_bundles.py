@@ -0,0 +1,146 @@
+import argparse
+import contextvars
+import json
+import shutil
+
+import query_engine as qe
+from dataset import DATA_DIR
+from instrumentation import span
+
+
+############################## FIGURE BUNDLES ##############################
+
+# A bundle is every figure of one (State, Years) selection, serialized once. Bundles for
+# each State and each single election year (which includes the default "latest year"
+# view) are pre-rendered offline with:
+#
+#   python figure_bundles.py build
+#
+# and served by the app when present, multi year selections are computed live.
+#
+# File layout, data/figure_bundles/<State>/<Year>.bundle:
+#   line 1   - json header {"version": <State version>, "State": ..., "Years": [...]}
+#   line 2.. - <figure name> TAB <plotly figure json>
+# so loading a bundle only parses the header, the figure json is handed out as is. figures
+# (and plot_traces, plotly's figure classes) are only imported when a figure is built.
+
+BUNDLE_DIR = DATA_DIR / 'figure_bundles'
+
+# every figure of a result in page order, built by figures.FIGURE_BUILDERS. Listed here so
+# checking a cached result does not import figures.
+FIGURE_NAMES = ['party_crime_sum', 'party_crime_box', 'cases_count_party_facet', 'party_cand_count',
+                'party_crime_sum2', 'party_avg_cases', 'party_avg_cases_lower', 'party_asset_sum',
+                'party_asset_buble', 'party_liability_sum', 'party_net_worth', 'rising_parties',
+                'repeat_offenders', 'asset_growth', 'crime_asset_buble', 'edu_crime_buble',
+                'edu_crime_buble_facet2', 'const_crime_sum', 'const_crime_sum_all']
+
+
+def selection_result(State_Selected, Year_Selected) -> dict:
+    from figures import build_figures
+
+    frames = qe.selection_frames(State_Selected, Year_Selected)
+    figures = build_figures(frames, State_Selected, Year_Selected)
+
+    with span('serialize.figures'):
+        figures_json = {name: fig.to_json() for name, fig in figures.items()}
+
+    return {'figures': figures_json}
+
+
+def submit_selection(executor, State_Selected, Year_Selected):
+    # same result as selection_result, built on a thread pool: the frames first (polars
+    # releases the GIL), then one task per figure in page order, so the first charts are
+    # ready long before the last. Returns {name: figure json future}.
+    from figures import FIGURE_BUILDERS
+
+    def submit(fn, *args):
+        # each task runs in a copy of the caller's context, spans land in the caller's trace
+        return executor.submit(contextvars.copy_context().run, fn, *args)
+
+    frames = submit(qe.selection_frames, State_Selected, Year_Selected)
+
+    def figure_json(name):
+        with span(f'figure.{name}'):
+            figure = FIGURE_BUILDERS[name](frames.result(), State_Selected, Year_Selected)
+
+        with span(f'serialize.{name}'):
+            return figure.to_json()
+
+    return {name: submit(figure_json, name) for name in FIGURE_NAMES}
+
+
+def collect_selection(figures) -> dict:
+    # the futures of submit_selection as one selection_result
+    return {'figures': {name: future.result() for name, future in figures.items()}}
+
+
+def complete_result(result) -> bool:
+    # results stored before a figure was added are not served
+    return result is not None and set(FIGURE_NAMES) <= result['figures'].keys()
+
+
+def bundle_path(State, Year):
+    return BUNDLE_DIR / State / f'{Year}.bundle'
+
+
+def write_bundle(result, version, State, Year) -> None:
+    path = bundle_path(State, Year)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(path, 'w') as f:
+        f.write(json.dumps({'version': version, 'State': State, 'Years': [Year]}) + '\n')
+        for name, fig_json in result['figures'].items():
+            f.write(f'{name}\t{fig_json}\n')
+
+
+def load_bundle(State_Selected, Year_Selected):
+    # only single year selections are pre-rendered
+    if len(Year_Selected) != 1:
+        return None
+
+    path = bundle_path(State_Selected, Year_Selected[0])
+    if not path.exists():
+        return None
+
+    with span('bundle.load'), open(path) as f:
+        header = json.loads(f.readline())
+
+        # rendered before the State's data last changed
+        if header['version'] != qe.version(State_Selected):
+            return None
+
+        figures = dict(line.rstrip('\n').split('\t', 1) for line in f)
+
+    return {'figures': figures}
+
+
+def build_bundles() -> int:
+    shutil.rmtree(BUNDLE_DIR, ignore_errors=True)
+
+    count = 0
+    for State in qe.states():
+        for Year in qe.years(State):
+            result = selection_result(State, [Year])
+            write_bundle(result, qe.version(State), State, Year)
+            count += 1
+
+    return count
+
+############################## FIGURE BUNDLES DONE ##############################
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pre-render dashboard figure bundles')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('build', help='render a bundle for every State and single election year')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        count = build_bundles()
+        print(f'Wrote {count} figure bundles to {BUNDLE_DIR}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,638 @@
+import plotly.graph_objects as go
+import polars as pl
+
+from dataset import CRORE
+from instrumentation import span
+from plot_traces import COLORS, bar, scatter, plot_column, customdata_columns
+
+
+############################## FIGURES ##############################
+
+# Plotly figures of the dashboard, built from the frames of query_engine.selection_frames().
+# Kept free of streamlit calls so the figures can be cached, serialized and built offline.
+
+
+# plotly imports its json engine (orjson when installed) lazily on the first to_json(). Called
+# once by whoever creates a thread pool, before it serializes figures concurrently, so the
+# workers never race on that import.
+def warm_json_engine() -> None:
+    go.Figure().to_json()
+
+
+# traces get plain strings, categorical columns are decoded only for the rows being plotted.
+# The frame stays in polars, plot_traces hands its columns to plotly without pandas.
+def to_plot_frame(df: pl.DataFrame) -> pl.DataFrame:
+    return df.with_columns(pl.col(pl.Categorical).cast(pl.Utf8))
+
+
+# point charts switch to WebGL above this many markers
+WEBGL_THRESHOLD = 1000
+
+
+def render_mode(df: pl.DataFrame) -> str:
+    return 'webgl' if df.height > WEBGL_THRESHOLD else 'svg'
+
+
+# from: https://plotly.com/python/facet-plots/?_gl=1*queipu*_ga*MTU0Nzk1NDk2NC4xNjgyMTYyMDYz*_ga_6G7EE0JNSC*MTY4MjY3NjAzOC4yOC4wLjE2ODI2NzYwNDUuMC4wLjA.#controlling-facet-ordering
+EDUCATION_ORDER = ["Doctorate","Post Graduate", "Graduate", "Graduate Professional",
+                   "12th Pass","10th Pass","8th Pass","5th Pass","Others","Literate"
+                   "Illiterate","Not Given"]
+
+
+
+############################## FIRST PLOT ##############################
+
+def party_crime_sum(frames, State_Selected, Year_Selected):
+    fig_party_crime_sum = bar(frames['highest_criminal_parties'].head(18).pipe(to_plot_frame),
+                                orientation='h',
+                                x='Criminal_Case',y='Party', color="Party",
+                                hover_name='Party',
+                                labels={
+                                        "Criminal_Case": "Total Criminal Cases",
+                                        "Party": "Political Parties"
+                                    },
+
+                            title=f'<b>Top 18 Political Parties with Highest Total Criminal Records from {State_Selected} in {Year_Selected} Elections</b>')
+
+    # fig_party_crime_sum.update_yaxes(autorange="reversed")
+    fig_party_crime_sum.update_layout(title_font_size=18, height = 500,
+                                        showlegend=False
+                                        )
+    fig_party_crime_sum.add_annotation(
+                                        showarrow=False,
+                                        text='Data Source: https://myneta.info/',
+                                        xanchor='right',
+                                        x=2,
+                                        xshift=575,
+                                        yanchor='bottom',
+                                        y=0.01 #,
+                                        # font=dict(
+                                        #     family="Courier New, monospace",
+                                        #     size=22,
+                                        #     color="#0000FF"
+                                    )
+
+    return fig_party_crime_sum
+
+
+
+############################## BOX PLOT ##############################
+
+def party_crime_box(frames, State_Selected, Year_Selected):
+    # boxes from the precomputed quartiles of all candidates, points from the thinned rows
+    fig_party_crime_box = go.Figure()
+
+    box_points = frames['box_plot'].pipe(to_plot_frame)
+    party_points = box_points.partition_by('Party', as_dict=True)
+
+    for i, stats in enumerate(frames['box_stats'].pipe(to_plot_frame).iter_rows(named=True)):
+        color = COLORS[i % len(COLORS)]
+        points = party_points.get(stats['Party'], box_points.head(0))
+
+        fig_party_crime_box.add_trace(go.Box(
+                                        name=stats['Party'], x=[stats['Party']], legendgroup=stats['Party'],
+                                        q1=[stats['q1']], median=[stats['median']], q3=[stats['q3']], mean=[stats['mean']],
+                                        lowerfence=[stats['lowerfence']], upperfence=[stats['upperfence']],
+                                        boxpoints=False, marker_color=color))
+
+        # invisible box carrying the points, drawn next to the real one like points = 'all'
+        fig_party_crime_box.add_trace(go.Box(
+                                        name=stats['Party'], x=plot_column(points, 'Party'), y=plot_column(points, 'Criminal_Case'),
+                                        customdata=plot_column(points, 'points'), legendgroup=stats['Party'], showlegend=False,
+                                        boxpoints='all', jitter=0.5, pointpos=-1.8, hoveron='points',
+                                        fillcolor='rgba(0,0,0,0)', line_width=0, marker_color=color,
+                                        hovertemplate='<b>%{x}</b><br>Count of Criminal Cases on Individual=%{y}'
+                                                      '<br>Candidates=%{customdata}<extra></extra>'))
+
+    return fig_party_crime_box.update_layout(
+        boxmode='overlay',
+        xaxis_title="Political Parties", yaxis_title="Count of Criminal Cases on Individual",
+        legend_title_text="Party",
+        title=f'<b>Top 6 Political Parties with Individual Criminal Record points & boxplot from<br> {State_Selected} in {Year_Selected} Elections</b>',
+        title_font_size=18, height = 450,
+        # xaxis=dict(autorange="reversed")
+        # plot_bgcolor = 'white'
+        )
+
+
+
+############################## FACET PLOT ##############################
+
+def cases_count_party_facet(frames, State_Selected, Year_Selected):
+    fig_cases_count_party_facet = bar(frames['cases_count_facet'].pipe(to_plot_frame),
+                                        orientation='h',
+                                        x='count',y='Criminal_Case', color="Party",
+                                        hover_name='Party',
+                                        facet_col="Party", facet_col_wrap=3,
+                                        labels={
+                                                "Criminal_Case": "Criminal Cases on a Candidate",
+                                                "count": "Count of candidates with Cases #"
+                                            },
+
+                                        title=f'<b>Top 6 Parties with Highest number of Criminal Record Candidate in {State_Selected} {Year_Selected} Elections</b>'
+                            )
+
+    fig_cases_count_party_facet.update_layout(title_font_size=18, height = 600,
+                                        showlegend=False
+                                        )
+
+    return fig_cases_count_party_facet
+
+
+
+############################## 3 PLOTS ##############################
+
+def party_cand_count(frames, State_Selected, Year_Selected):
+    fig_party_cand_count = bar(frames['cases_agg'].sort(by='candidates_count',descending=True
+                                    ).head(18).pipe(to_plot_frame),
+                                    orientation='h',
+                                    x='candidates_count',y='Party', color="Party",
+                                    hover_name='Party',
+                                    labels={
+                                            "candidates_count": "Total Candidates",
+                                            "Party": "Political Parties"
+                                        },
+
+                                title=f'<b>Highest Total Candidates in {Year_Selected} Elections</b>'
+                                )
+    fig_party_cand_count.update_layout(title_font_size=16, height = 600,
+                                        showlegend=False
+                                        )
+
+    return fig_party_cand_count
+
+
+def party_crime_sum2(frames, State_Selected, Year_Selected):
+    fig_party_crime_sum2 = party_crime_sum(frames, State_Selected, Year_Selected)
+
+    fig_party_crime_sum2.update_layout(title_font_size=16, height = 600,
+                                        showlegend=False,
+                                        title_text = f'<b>Highest Total Criminal Cases in {Year_Selected} Elections</b>'
+                                        )
+
+    return fig_party_crime_sum2
+
+
+def party_avg_cases(frames, State_Selected, Year_Selected, rank_by='avg_cases'):
+    # error bars: 95% interval of the average (see stats_engine)
+    avg_cases = frames['cases_agg'].sort(by=rank_by,descending=True
+                                    ).head(18).with_columns([
+                                        (pl.col('avg_cases_high') - pl.col('avg_cases')).alias('error_plus'),
+                                        (pl.col('avg_cases') - pl.col('avg_cases_low')).alias('error_minus'),
+                                    ])
+
+    fig_party_avg_cases = bar(avg_cases.pipe(to_plot_frame),
+                                    orientation='h',
+                                    x='avg_cases',y='Party', color="Party",
+                                    error_x='error_plus', error_x_minus='error_minus',
+                                    hover_name='Party',
+                                    hover_data={'candidates_count': True, 'avg_cases_low': ':.2f',
+                                                'avg_cases_high': ':.2f', 'error_plus': False,
+                                                'error_minus': False},
+                                    labels={
+                                            "avg_cases": "Average Case (Cases/Candidates) ",
+                                            "candidates_count": "Total Candidates",
+                                            "avg_cases_low": "95% interval from",
+                                            "avg_cases_high": "95% interval to",
+                                            "Party": "Political Parties"
+                                        },
+
+                                title=f'<b>Highest Average Criminal Cases in {Year_Selected} Elections</b>'
+                                )
+    fig_party_avg_cases.update_layout(title_font_size=16, height = 600,
+                                        showlegend=False
+                                        )
+
+    return fig_party_avg_cases
+
+
+def party_avg_cases_lower(frames, State_Selected, Year_Selected):
+    # parties we are confident have a high average, small parties no longer top the chart on a few candidates
+    fig_party_avg_cases_lower = party_avg_cases(frames, State_Selected, Year_Selected, rank_by='avg_cases_low')
+
+    fig_party_avg_cases_lower.update_layout(
+                                        title_text = f'<b>Highest Average Criminal Cases in {Year_Selected} Elections <br>(ranked by lower end of 95% interval)</b>'
+                                        )
+
+    return fig_party_avg_cases_lower
+
+
+
+############################## ASSET PLOTS ##############################
+
+def party_asset_sum(frames, State_Selected, Year_Selected):
+    fig_party_asset_sum = bar(frames['party_asset_sum'].pipe(to_plot_frame),
+                                    orientation='h',
+                                    x='Total_Assets',y='Party', color="Party",
+                                    facet_col="Year", facet_col_wrap=2,
+                                    hover_name='Party',
+                                    labels={
+                                            "Total_Assets": "Total Assets (in Crore Rs.)",
+                                            "Party": "Political Parties"
+                                        },
+
+                                title=f'<b>Top 18 Political Parties with Highest Total Sum of Assets of candidates <br>from {State_Selected} in Elections</b>')
+
+    # fig_party_crime_sum.update_yaxes(autorange="reversed")
+    fig_party_asset_sum.update_layout(title_font_size=18, height = 500,
+                                        showlegend=False
+                                        )
+    # fig_party_asset_sum.update_traces(hovertemplate= 'Rs. %{x:.2f}')
+
+    return fig_party_asset_sum
+
+
+def party_asset_buble(frames, State_Selected, Year_Selected):
+    return scatter(frames['asset_scatter'].pipe(to_plot_frame),
+                                        x = 'Party',
+                                        y = 'Total_Assets',
+                                        hover_name='Party',
+                                        hover_data=['points'],
+                                        color = 'Party', # will display dots next to the boxes
+                                        render_mode=render_mode(frames['asset_scatter']),
+                                        labels={
+                                                    "Total_Assets": "Total Assets (in Rs) of Candidate",
+                                                    "Party": "Political Parties",
+                                                    "points": "Candidates"
+                                                                    },
+
+                                title=f'<b>Top 6 Political Parties with Individual <br>Total Asset Record points from {State_Selected} <br>in {Year_Selected} Elections</b>'
+        ).update_layout(
+        title_font_size=18, height = 500,
+        showlegend = False
+        )
+
+
+
+############################## LIABILITY PLOTS ##############################
+
+def party_liability_sum(frames, State_Selected, Year_Selected):
+    fig_party_liability_sum = bar(frames['cases_agg'].sort(by='Liabilities_Cr',descending=True
+                                    ).head(18).pipe(to_plot_frame),
+                                    orientation='h',
+                                    x='Liabilities_Cr',y='Party', color="Party",
+                                    hover_name='Party',
+                                    labels={
+                                            "Liabilities_Cr": "Total Liabilities (in Crore Rs.)",
+                                            "Party": "Political Parties"
+                                        },
+
+                                title=f'<b>Top 18 Political Parties with Highest Total Liabilities of candidates <br>from {State_Selected} in {Year_Selected} Elections</b>')
+
+    fig_party_liability_sum.update_layout(title_font_size=18, height = 500,
+                                        showlegend=False
+                                        )
+
+    return fig_party_liability_sum
+
+
+def party_net_worth(frames, State_Selected, Year_Selected):
+    fig_party_net_worth = bar(frames['cases_agg'].sort(by='Net_Worth_Cr',descending=True
+                                    ).head(18).pipe(to_plot_frame),
+                                    orientation='h',
+                                    x='Net_Worth_Cr',y='Party', color="Party",
+                                    hover_name='Party',
+                                    hover_data=['Total_Assets_Cr', 'Liabilities_Cr'],
+                                    labels={
+                                            "Net_Worth_Cr": "Net Worth (Assets - Liabilities, in Crore Rs.)",
+                                            "Total_Assets_Cr": "Total Assets (in Crore Rs.)",
+                                            "Liabilities_Cr": "Total Liabilities (in Crore Rs.)",
+                                            "Party": "Political Parties"
+                                        },
+
+                                title=f'<b>Top 18 Political Parties with Highest Net Worth of candidates <br>from {State_Selected} in {Year_Selected} Elections</b>')
+
+    fig_party_net_worth.update_layout(title_font_size=18, height = 500,
+                                        showlegend=False
+                                        )
+
+    return fig_party_net_worth
+
+
+
+############################## TREND PLOT ##############################
+
+def rising_parties(frames, State_Selected, Year_Selected):
+    # None when the selection only holds the State's first election
+    Year = frames['trend_year']
+    rising = frames['rising_parties']
+
+    if Year is None:
+        title = (f'<b>{State_Selected} {max(Year_Selected)} is the first election on record, <br>'
+                 'there is no previous election to compare with</b>')
+    elif rising.is_empty():
+        title = f'<b>No party has more criminal cases in {State_Selected} {Year} <br>than in the previous election</b>'
+    else:
+        title = (f'<b>Fastest rising Political Parties by Criminal Cases <br>from {State_Selected} '
+                 f'{rising[0, "prev_Year"]} to {Year} Elections</b>')
+
+    fig_rising_parties = bar(rising.with_columns(
+                                    (pl.col('Total_Assets_delta') / CRORE).alias('Total_Assets_delta')
+                                    ).pipe(to_plot_frame),
+                                    orientation='h',
+                                    x='total_criminal_cases_delta',y='Party', color="Party",
+                                    hover_name='Party',
+                                    hover_data=['prev_total_criminal_cases', 'total_criminal_cases',
+                                                'candidates_count_delta', 'Total_Assets_delta'],
+                                    labels={
+                                            "total_criminal_cases_delta": "Increase in Criminal Cases",
+                                            "prev_total_criminal_cases": "Criminal Cases in previous Election",
+                                            "total_criminal_cases": "Criminal Cases",
+                                            "candidates_count_delta": "Change in Candidates",
+                                            "Total_Assets_delta": "Change in Total Assets (in Crore Rs.)",
+                                            "Party": "Political Parties"
+                                        },
+
+                                title=title)
+
+    fig_rising_parties.update_yaxes(autorange="reversed")
+    fig_rising_parties.update_layout(title_font_size=18, height = 500,
+                                        showlegend=False
+                                        )
+
+    return fig_rising_parties
+
+
+
+############################## REPEAT CANDIDATES PLOT ##############################
+
+def _repeat_candidate_rows(frames, sort_by, n=15) -> pl.DataFrame:
+    # a person is one bar, labelled with the latest Candidate name and Constituency
+    return frames['repeat_candidates'].sort(by=sort_by, descending=True).head(n).with_columns(
+                (pl.col('Candidate') + ' (' + pl.col('Constituency').cast(pl.Utf8).fill_null('-') + ')'
+                 ).alias('Politician'),
+                pl.col('Party').cast(pl.Utf8))
+
+
+def repeat_offenders(frames, State_Selected, Year_Selected):
+    repeat = _repeat_candidate_rows(frames, ['elections_with_cases', 'last_cases']).filter(
+                                        pl.col('elections_with_cases') > 0)
+
+    fig_repeat_offenders = bar(repeat.pipe(to_plot_frame),
+                                    orientation='h',
+                                    x='last_cases',y='Politician', color="Party",
+                                    hover_name='Politician',
+                                    hover_data=['elections', 'elections_with_cases', 'first_Year',
+                                                'first_cases', 'last_Year'],
+                                    labels={
+                                            "last_cases": "Criminal Cases at latest Election",
+                                            "elections": "Elections contested",
+                                            "elections_with_cases": "Elections with Criminal Cases",
+                                            "first_Year": "First Election",
+                                            "first_cases": "Criminal Cases at first Election",
+                                            "last_Year": "Latest Election",
+                                            "Politician": "Candidate (Constituency)"
+                                        },
+
+                                title=f'<b>Repeat Candidates with Criminal Cases in {State_Selected} <br>across all Elections</b>')
+
+    fig_repeat_offenders.update_yaxes(autorange="reversed")
+    fig_repeat_offenders.update_layout(title_font_size=18, height = 500)
+
+    return fig_repeat_offenders
+
+
+def asset_growth(frames, State_Selected, Year_Selected):
+    growth = _repeat_candidate_rows(frames, ['asset_growth'])
+
+    fig_asset_growth = bar(growth.pipe(to_plot_frame),
+                                orientation='h',
+                                x='asset_growth',y='Politician', color="Party",
+                                hover_name='Politician',
+                                hover_data=['first_Year', 'first_assets', 'last_Year', 'last_assets',
+                                            'last_cases'],
+                                labels={
+                                        "asset_growth": "Growth in Total Assets (in Crore Rs.)",
+                                        "first_Year": "First Election",
+                                        "first_assets": "Total Assets at first Election (in Crore Rs.)",
+                                        "last_Year": "Latest Election",
+                                        "last_assets": "Total Assets at latest Election (in Crore Rs.)",
+                                        "last_cases": "Criminal Cases at latest Election",
+                                        "Politician": "Candidate (Constituency)"
+                                    },
+
+                            title=f'<b>Repeat Candidates with the largest Asset Growth <br>in {State_Selected} across Elections</b>')
+
+    fig_asset_growth.update_yaxes(autorange="reversed")
+    fig_asset_growth.update_layout(title_font_size=18, height = 500)
+
+    return fig_asset_growth
+
+
+
+############################## ASSET CRIME BUBBLE PLOT ##############################
+
+def crime_asset_buble(frames, State_Selected, Year_Selected):
+    fig_crime_asset_buble = scatter(frames['crime_asset_bubble'].pipe(to_plot_frame),
+                                        x='Criminal_Case',y='Total_Assets', color="Party",
+                                        hover_name="Party",
+                                        hover_data=['points'],
+                                        render_mode=render_mode(frames['crime_asset_bubble']),
+                                        # size = 'Total_Assets',
+                                        labels={
+                                                "Criminal_Case": "Total Criminal Cases",
+                                                "Party": "Political Parties",
+                                                "Total_Assets": "Total Assets (in Rs) of Candidate",
+                                                "points": "Candidates"
+                                            },
+
+                            title=f'<b>Total Asset of Individual Vs Criminal Cases of Top 6 Political Parties from {State_Selected} in {Year_Selected} Elections</b>')
+
+    # fig_party_crime_sum.update_yaxes(autorange="reversed")
+    fig_crime_asset_buble.update_layout(title_font_size=18, height = 500,
+                                        # showlegend=False
+                                        )
+
+    return fig_crime_asset_buble
+
+
+
+############################## EDUCATION BUBBLE PLOT ##############################
+
+def edu_crime_buble(frames, State_Selected, Year_Selected):
+    return scatter(frames['edu_party_facet'].pipe(to_plot_frame),
+                                            x = 'Criminal_Case', y = 'Total_Assets', color='Education', size='Criminal_Case',
+                                            facet_col='Party', facet_col_wrap=3, opacity=0.6,
+                                            labels={
+                                                    "Criminal_Case": "Criminal Cases",
+                                                    "Party": "Political Parties",
+                                                    "Total_Assets": "Total Assets (in Rs)"
+                                                },
+                                            category_orders={"Education": EDUCATION_ORDER},
+
+                                title=f'<b>Criminal Cases of Top 6 Political Parties by Education(Size wrt to Criminal Cases) from {State_Selected} in {Year_Selected} Elections</b>'
+                                ).update_layout(title_font_size=18, height = 600
+                                            # showlegend=False
+                                            # plot_bgcolor = 'rgba(0, 0, 0, 0)',
+                                            # paper_bgcolor = 'rgba(0, 0, 0, 0)'
+                                            )
+
+
+def edu_crime_buble_facet2(frames, State_Selected, Year_Selected):
+    return scatter(frames['edu_education_facet'].pipe(to_plot_frame),
+                                            x = 'Criminal_Case', y = 'Total_Assets', color='Party', size='Criminal_Case',
+                                            facet_col='Education', facet_col_wrap=3, opacity=0.6,
+                                            labels={
+                                                    "Criminal_Case": "Criminal Cases",
+                                                    "Party": "Political Parties",
+                                                    "Total_Assets": "Total Assets (in Rs)"
+                                                },
+                                            category_orders={"Education": EDUCATION_ORDER},
+
+                                title=f'<b>Criminal Cases of Top 6 Political Parties by Education(Size wrt to Criminal Cases) from {State_Selected} in {Year_Selected} Elections</b>'
+                                ).update_layout(title_font_size=18, height = 700
+                                            # showlegend=False
+                                            # plot_bgcolor = 'rgba(0, 0, 0, 0)',
+                                            # paper_bgcolor = 'rgba(0, 0, 0, 0)'
+                                            )
+
+
+
+############################## CONSTITUENCY PLOT ##############################
+
+def const_crime_sum(frames, State_Selected, Year_Selected):
+    return bar(
+                                    frames['const_crime_sum'].pipe(to_plot_frame),
+                                    orientation='v',
+                                    barmode = 'stack',
+                                    x='Constituency',y='Criminal_Case', color="Party",
+                                    hover_name="Constituency",
+
+                                    labels={
+                                            "Total_Assets": "Total Assets (in Rs.)",
+                                            "Party": "Political Parties"
+                                        },
+
+                                    title=f'<b>Constituencies with highest Criminal Cases Candidates of Top 6 Parties from {State_Selected[0]} in {Year_Selected[0]} Elections</b>'
+                                    # title= " ".join('Constituencies with highest Criminal Cases Candidates of Top 6 Parties from', State_Selected[0], 'in', Year_Selected[0], 'Elections'))
+
+    ).update_xaxes(autorange="reversed").update_layout(title_font_size=18, height = 600,
+                                            # showlegend=False
+                                            )
+
+
+def const_crime_sum_all(frames, State_Selected, Year_Selected):
+    return bar(
+                                    frames['const_crime_sum_all'].pipe(to_plot_frame),
+                                    orientation='v',
+                                    barmode = 'stack',
+                                    x='Constituency',y='Criminal_Case', color="Party",
+                                    hover_name="Constituency",
+                                    labels={
+                                            "Total_Assets": "Total Assets (in Rs.)",
+                                            "Party": "Political Parties"
+                                        },
+
+                                    title=f'<b>Constituencies with highest Criminal Cases Candidates from {State_Selected} in {Year_Selected} Elections</b>'
+    ).update_xaxes(autorange="reversed").update_layout(title_font_size=18, height = 600,
+                                            # showlegend=False
+                                            )
+
+
+# not part of FIGURE_BUILDERS: the map is built from the State's geometry store (see
+# geometry.py) instead of the selection frames, and is never written into a bundle
+def constituency_choropleth(map_frame, geojson):
+    fig_choropleth_assembly = go.Figure(go.Choropleth(
+                                                    geojson=geojson,
+                                                    locations=map_frame['AC_NAME'],
+                                                    z=map_frame['Criminal_Case'],
+                                                    customdata=map_frame['Total_Assets'],
+                                                    colorscale="magma",
+                                                    marker_line_width=0.3,
+                                                    hovertemplate='<b>%{location}</b><br>Criminal_Case=%{z}<br>Total_Assets=%{customdata:,.0f}<extra></extra>'
+                                                    ))
+
+    fig_choropleth_assembly.update_geos(fitbounds="locations", visible=False
+                                        ).update_layout(
+                                    paper_bgcolor = 'rgba(0, 0, 0, 0)',
+                                    geo=dict(bgcolor= 'rgba(0,0,0,0)'),
+                                    margin=dict(l=0, r=0, t=0, b=0),
+                                    height = 580, width = 450
+                                    )
+
+    return fig_choropleth_assembly
+
+
+
+############################## ALL INDIA PLOT ##############################
+
+# not part of FIGURE_BUILDERS either, it does not depend on the selection and is drawn
+# from the fixed size (Party, State) summary of aggregates.build_national_summary
+def all_india_parties(summary: pl.DataFrame):
+    summary = summary.filter(pl.col('with_cases') > 0)
+
+    # parties with the highest single candidate record at the top, like categoryorder 'max ascending'
+    party_order = summary.groupby('Party').agg(pl.col('max_cases').max()
+                        ).sort(by='max_cases').get_column('Party').cast(pl.Utf8).to_list()
+
+    fig_all_ind_parties = go.Figure()
+    state_summaries = summary.pipe(to_plot_frame).partition_by('State', as_dict=True)
+
+    for i, (State, state_summary) in enumerate(sorted(state_summaries.items())):
+        color = COLORS[i % len(COLORS)]
+
+        fig_all_ind_parties.add_trace(go.Box(
+                                        name=State, legendgroup=State, orientation='h',
+                                        y=plot_column(state_summary, 'Party'),
+                                        q1=plot_column(state_summary, 'q25_cases'),
+                                        median=plot_column(state_summary, 'median_cases'),
+                                        q3=plot_column(state_summary, 'q75_cases'),
+                                        lowerfence=plot_column(state_summary, 'min_cases'),
+                                        upperfence=plot_column(state_summary, 'max_cases'),
+                                        marker_color=color))
+
+        # highest record of every (Party, State) with the case bucket counts on hover
+        fig_all_ind_parties.add_trace(go.Scatter(
+                                        name=State, legendgroup=State, showlegend=False, mode='markers',
+                                        x=plot_column(state_summary, 'max_cases'), y=plot_column(state_summary, 'Party'),
+                                        customdata=customdata_columns(state_summary, ['with_cases', 'candidates_count', 'cases_1', 'cases_2_3',
+                                                                                      'cases_4_5', 'cases_6_10', 'cases_11_plus']),
+                                        marker=dict(color=color, symbol='diamond', size=8, opacity=0.7),
+                                        hovertemplate=f'<b>%{{y}}</b> in {State}<br>Highest Criminal_Case=%{{x}}'
+                                                      '<br>Candidates with cases=%{customdata[0]} of %{customdata[1]}'
+                                                      '<br>1: %{customdata[2]}, 2-3: %{customdata[3]}, 4-5: %{customdata[4]}'
+                                                      ', 6-10: %{customdata[5]}, 11+: %{customdata[6]}<extra></extra>'))
+
+    return fig_all_ind_parties.update_layout(
+                                    boxmode='group', height = 1400,
+                                    xaxis_title="Criminal_Case", yaxis_title="Party", legend_title_text="State",
+                                    title = "Top 50 Parties in India by highest Criminal Records of Candidates in Latest State Elections"
+                                    ).update_yaxes(type='category', categoryorder='array', categoryarray=party_order)
+
+
+
+############################## ALL FIGURES ##############################
+
+# same names and order as figure_bundles.FIGURE_NAMES
+FIGURE_BUILDERS = {
+    'party_crime_sum': party_crime_sum,
+    'party_crime_box': party_crime_box,
+    'cases_count_party_facet': cases_count_party_facet,
+    'party_cand_count': party_cand_count,
+    'party_crime_sum2': party_crime_sum2,
+    'party_avg_cases': party_avg_cases,
+    'party_avg_cases_lower': party_avg_cases_lower,
+    'party_asset_sum': party_asset_sum,
+    'party_asset_buble': party_asset_buble,
+    'party_liability_sum': party_liability_sum,
+    'party_net_worth': party_net_worth,
+    'rising_parties': rising_parties,
+    'repeat_offenders': repeat_offenders,
+    'asset_growth': asset_growth,
+    'crime_asset_buble': crime_asset_buble,
+    'edu_crime_buble': edu_crime_buble,
+    'edu_crime_buble_facet2': edu_crime_buble_facet2,
+    'const_crime_sum': const_crime_sum,
+    'const_crime_sum_all': const_crime_sum_all,
+}
+
+
+def build_figures(frames, State_Selected, Year_Selected) -> dict:
+    figures = {}
+    for name, builder in FIGURE_BUILDERS.items():
+        with span(f'figure.{name}'):
+            figures[name] = builder(frames, State_Selected, Year_Selected)
+
+    return figures
+
+############################## FIGURES DONE ##############################
@@ -0,0 +1,185 @@
+import argparse
+import json
+import re
+import shutil
+from functools import lru_cache
+from pathlib import Path
+
+from dataset import BASE_DIR, DATA_DIR
+
+
+############################## GEOMETRY STORE ##############################
+
+# Constituency map of the dashboard. Reading the exported shapefile with geopandas and
+# shipping its full resolution __geo_interface__ on every rerun is too slow, so the
+# geometry is prepared offline with:
+#
+#   python geometry.py build [--shapefile shape_file_exported/final_shp_export.shp]
+#
+# which simplifies each State's constituencies as one coverage (shared borders are
+# simplified once, no gaps or slivers between neighbours), rounds the coordinates to the
+# precision the State map can show and stores one small json per State:
+#
+#   data/geometry/<State>.json
+#     {"State": ..., "geojson": FeatureCollection, feature id = AC_NAME, properties = {"AC_NAME": ...}}
+#
+# Only the shapes are stored. The crime and asset numbers are joined from the dataset's
+# constituency index on every rerun, so the map agrees with the other charts after
+# data_build appends an election.
+#
+# geopandas/shapely are only needed for the build, the app loads the selected State's
+# json lazily with the standard library.
+
+SHAPEFILE = BASE_DIR / 'shape_file_exported' / 'final_shp_export.shp'
+GEOMETRY_DIR = DATA_DIR / 'geometry'
+
+# simplification tolerance (degrees) and coordinate decimals of a State map
+TOLERANCE, DECIMALS = 0.002, 4
+
+
+def geometry_path(State) -> Path:
+    return GEOMETRY_DIR / f'{State}.json'
+
+
+@lru_cache(maxsize=16)
+def _read_geometry(path, mtime) -> dict:
+    # mtime in the key: a rebuilt store is read again
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_state_geometry(State):
+    # None when the geometry store was not built (or has no map of the State), not
+    # cached so the map shows up once it is built
+    path = geometry_path(State)
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    return _read_geometry(path, mtime)
+
+
+def map_key(name) -> str:
+    # the shapefile and the affidavits space and punctuate some seats differently,
+    # 'AMBEDKAR NAGAR(SC)' / 'AMBEDKAR NAGAR (SC)'
+    return re.sub(r'[^A-Z0-9]', '', name.upper())
+
+
+def constituency_map_frame(geometry, totals) -> dict:
+    # criminal cases and assets of every mapped constituency, totals is
+    # query_engine.constituency_totals of the selected State and years
+    AC_NAMES = {map_key(feature['id']): feature['id'] for feature in geometry['geojson']['features']}
+
+    numbers = {}
+    for Constituency, Criminal_Case, Total_Assets in totals.select(
+                ['Constituency', 'total_criminal_cases', 'Total_Assets']).iter_rows():
+        AC_NAME = AC_NAMES.get(map_key(Constituency or ''))
+        if AC_NAME is None:
+            continue
+
+        entry = numbers.setdefault(AC_NAME, [0, 0.0])
+        entry[0] += Criminal_Case or 0
+        entry[1] += Total_Assets or 0.0
+
+    return {'AC_NAME': list(numbers),
+            'Criminal_Case': [Criminal_Case for Criminal_Case, _ in numbers.values()],
+            'Total_Assets': [Total_Assets for _, Total_Assets in numbers.values()]}
+
+############################## GEOMETRY STORE DONE ##############################
+
+
+
+
+############################## GEOMETRY BUILD ##############################
+
+def read_shapefile(shapefile):
+    import geopandas as gp
+
+    # the export has one row per constituency part and election year
+    return gp.read_file(shapefile).to_crs(epsg=4326)
+
+
+def simplify_coverage(geometries, tolerance):
+    import shapely
+
+    # shapely >= 2.1 simplifies the shared edges of a polygon coverage once, older
+    # versions simplify each constituency on its own
+    if hasattr(shapely, 'coverage_simplify'):
+        return shapely.coverage_simplify(geometries, tolerance)
+
+    return shapely.simplify(geometries, tolerance, preserve_topology=True)
+
+
+def quantize(geometry, decimals):
+    import numpy as np
+    import shapely
+
+    return shapely.transform(geometry, lambda coords: np.round(coords, decimals))
+
+
+def state_geojson(constituencies) -> dict:
+    import shapely
+
+    geometries = simplify_coverage(constituencies.geometry.values, TOLERANCE)
+
+    features = []
+    for AC_NAME, geometry in zip(constituencies['AC_NAME'], geometries):
+        if geometry.is_empty:
+            continue
+
+        features.append({
+            'type': 'Feature',
+            'id': AC_NAME,
+            'properties': {'AC_NAME': AC_NAME},
+            'geometry': json.loads(shapely.to_geojson(quantize(geometry, DECIMALS))),
+        })
+
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def build_geometry(shapefile=SHAPEFILE) -> int:
+    shapes = read_shapefile(shapefile)
+
+    # one (multi)polygon per constituency, whatever the number of parts and years exported
+    constituencies = shapes[['State', 'AC_NAME', 'geometry']].dissolve(by=['State', 'AC_NAME']
+                                                                      ).reset_index()
+    constituencies['geometry'] = constituencies.geometry.make_valid()
+
+    tmp_dir = GEOMETRY_DIR.with_name('geometry.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    count = 0
+    for State, state_constituencies in constituencies.groupby('State'):
+        geometry = {'State': State, 'geojson': state_geojson(state_constituencies)}
+
+        with open(tmp_dir / f'{State}.json', 'w') as f:
+            json.dump(geometry, f, separators=(',', ':'))
+        count += 1
+
+    shutil.rmtree(GEOMETRY_DIR, ignore_errors=True)
+    tmp_dir.rename(GEOMETRY_DIR)
+    _read_geometry.cache_clear()
+
+    return count
+
+############################## GEOMETRY BUILD DONE ##############################
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the simplified constituency geometry store')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='simplify the shapefile and write one json per State')
+    build.add_argument('--shapefile', default=SHAPEFILE, type=Path)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        count = build_geometry(args.shapefile)
+        print(f'Wrote {count} State geometries to {GEOMETRY_DIR}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+############### Instrumentation ###############
+
+# Lightweight span timer for the hot path of a rerun. A trace is started per rerun and every
+# `with span(...)` inside it (dashboard sections, .collect() calls, figure builders) is
+# recorded with its duration. Outside a trace span() is a no-op, so library code can be
+# instrumented unconditionally.
+#
+# Finished traces are rolled into process wide per (span, State) totals, exported as
+# Prometheus text (DASHBOARD_METRICS_FILE, e.g. for node_exporter's textfile collector)
+# and optionally appended as JSON lines (DASHBOARD_TRACE_FILE).
+
+TRACE_FILE = os.environ.get('DASHBOARD_TRACE_FILE')
+METRICS_FILE = os.environ.get('DASHBOARD_METRICS_FILE')
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+# nesting level of the running span, per thread/task like the trace itself: work handed to
+# a pool with contextvars.copy_context().run records into the same trace, nested under
+# the span it was submitted from
+_span_depth = contextvars.ContextVar('span_depth', default=0)
+
+
+class Trace:
+
+    def __init__(self, name, capture_plans=False, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.capture_plans = capture_plans
+
+        self.spans = []     # dicts with name, start, seconds, depth + span attrs
+        self.plans = {}     # name -> optimized polars plan
+        self.started = time.time()
+        self.seconds = None
+
+        self._lock = threading.Lock()
+
+    def add_span(self, record) -> None:
+        with self._lock:
+            self.spans.append(record)
+
+    def to_records(self) -> list:
+        return [dict(trace=self.name, **self.attrs, **record) for record in self.spans]
+
+    def to_jsonl(self) -> str:
+        return ''.join(json.dumps(record, default=str) + '\n' for record in self.to_records())
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def start_trace(name, capture_plans=False, **attrs) -> Trace:
+    tr = Trace(name, capture_plans=capture_plans, **attrs)
+    tr._token = _current_trace.set(tr)
+    tr._start = time.perf_counter()
+
+    return tr
+
+
+def end_trace(tr: Trace) -> None:
+    tr.seconds = time.perf_counter() - tr._start
+    _current_trace.reset(tr._token)
+    finish_trace(tr)
+
+
+@contextmanager
+def trace(name, capture_plans=False, **attrs):
+    tr = start_trace(name, capture_plans=capture_plans, **attrs)
+    try:
+        yield tr
+    finally:
+        end_trace(tr)
+
+
+@contextmanager
+def span(name, **attrs):
+    tr = _current_trace.get()
+    if tr is None:
+        yield
+        return
+
+    depth = _span_depth.get()
+    token = _span_depth.set(depth + 1)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        _span_depth.reset(token)
+        tr.add_span(dict(name=name, start=start, seconds=seconds, depth=depth, **attrs))
+
+
+def record_plan(name, lf) -> None:
+    # explain() is not free, plans are only kept when the debug panel asked for them
+    tr = _current_trace.get()
+    if tr is not None and tr.capture_plans:
+        tr.plans[name] = lf.explain(optimized=True)
+
+############### Instrumentation Ends ###############
+
+
+
+############### Metrics Export ###############
+
+class SpanMetrics:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}   # (span, State) -> [count, sum seconds, max seconds]
+
+    def observe(self, tr: Trace) -> None:
+        State = str(tr.attrs.get('State', ''))
+        with self._lock:
+            for record in tr.spans + [dict(name=tr.name, seconds=tr.seconds)]:
+                totals = self._totals.setdefault((record['name'], State), [0, 0.0, 0.0])
+                totals[0] += 1
+                totals[1] += record['seconds']
+                totals[2] = max(totals[2], record['seconds'])
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            items = sorted(self._totals.items())
+
+        lines = ['# HELP dashboard_span_seconds Time spent in each instrumented section of a rerun.',
+                 '# TYPE dashboard_span_seconds summary']
+        for (name, State), (count, total, _) in items:
+            labels = f'span="{name}",state="{State}"'
+            lines.append(f'dashboard_span_seconds_sum{{{labels}}} {total:.6f}')
+            lines.append(f'dashboard_span_seconds_count{{{labels}}} {count}')
+
+        lines += ['# HELP dashboard_span_seconds_max Slowest observation of each section.',
+                  '# TYPE dashboard_span_seconds_max gauge']
+        for (name, State), (_, _, slowest) in items:
+            lines.append(f'dashboard_span_seconds_max{{span="{name}",state="{State}"}} {slowest:.6f}')
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics = SpanMetrics()
+
+_export_lock = threading.Lock()
+
+
+def finish_trace(tr: Trace) -> None:
+    metrics.observe(tr)
+
+    if TRACE_FILE:
+        with _export_lock, open(TRACE_FILE, 'a') as f:
+            f.write(tr.to_jsonl())
+
+    if METRICS_FILE:
+        # written to a temp file and renamed so scrapers never read a partial file
+        with _export_lock:
+            with open(METRICS_FILE + '.tmp', 'w') as f:
+                f.write(metrics.prometheus_text())
+            os.replace(METRICS_FILE + '.tmp', METRICS_FILE)
+
+############### Metrics Export Ends ###############
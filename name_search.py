@@ -0,0 +1,171 @@
+import re
+import unicodedata
+
+import numpy as np
+import polars as pl
+import pyarrow as pa
+
+
+############################## NAME SEARCH ##############################
+
+# "Find candidate X across all states and years" from a prebuilt trigram index instead of
+# a str.contains over every row. Candidate names are folded (case, diacritics, punctuation
+# and common transliteration variants: Imtiyaj / Imtiaz, Poonam / Punam, Shri / Sri)
+# and every word is indexed by its trigrams, padded at the start so the first trigrams of a
+# word double as its prefix. A query is folded the same way, the postings of its trigrams
+# are counted per name with one np.bincount and the names sharing most of them win, so
+# partly typed words and typos still match.
+#
+# Two Arrow files written next to the partitions by data_build (memory mapped, the numpy
+# views below point straight into them):
+#
+#   name_index.arrow     one row per folded name: name, trigrams (count), rows (list of
+#                        global row ids, i.e. manifest partition offset + row in partition)
+#   trigram_index.arrow  one row per trigram code (all TRIGRAM_CODES of them, in order):
+#                        names (list of name ids in name_index order)
+
+ALPHABET = ' abcdefghijklmnopqrstuvwxyz0123456789'
+CHAR_CODES = {char: code for code, char in enumerate(ALPHABET)}
+TRIGRAM_CODES = len(ALPHABET) ** 3
+
+# spelling variants folded to one form, applied in order after lower casing
+TRANSLITERATION = [
+    (r'[^a-z0-9 ]', ' '),
+    (r'\b(shri|sri|smt|dr|adv|alias|urf)\b', ' '),
+    (r'ph', 'f'), (r'([bdgjkt])h', r'\1'), (r'sh', 's'), (r'ch', 'c'),
+    (r'ee|ie', 'i'), (r'oo|ou', 'u'), (r'w', 'v'), (r'z', 'j'), (r'q', 'k'), (r'y', 'i'),
+    (r'ck', 'k'), (r'([a-z])\1+', r'\1'),
+]
+TRANSLITERATION = [(re.compile(pattern), repl) for pattern, repl in TRANSLITERATION]
+
+MIN_SCORE = 0.6
+
+
+def fold_name(name) -> str:
+    # case and diacritic folded ascii with transliteration variants collapsed
+    name = unicodedata.normalize('NFKD', name or '')
+    name = ''.join(char for char in name if not unicodedata.combining(char)).lower()
+
+    for pattern, repl in TRANSLITERATION:
+        name = pattern.sub(repl, name)
+
+    return ' '.join(name.split())
+
+
+def trigram_codes(folded, complete=True) -> np.ndarray:
+    # unique trigram codes of every word, padded "  word " - the last word of a query
+    # being typed is not closed (complete=False) so it matches as a prefix
+    words = folded.split()
+    codes = set()
+    for i, word in enumerate(words):
+        padded = '  ' + word + (' ' if complete or i < len(words) - 1 else '')
+        for j in range(len(padded) - 2):
+            a, b, c = (CHAR_CODES[char] for char in padded[j:j + 3])
+            codes.add((a * len(ALPHABET) + b) * len(ALPHABET) + c)
+
+    return np.fromiter(codes, dtype=np.int64, count=len(codes))
+
+############################## NAME SEARCH DONE ##############################
+
+
+
+
+############################## NAME INDEX BUILD ##############################
+
+def _list_array(offsets, values, value_type) -> pa.ListArray:
+    return pa.ListArray.from_arrays(pa.array(offsets, pa.int32()), pa.array(values, value_type))
+
+
+def build_name_index(candidates: pl.Series):
+    # candidates: Candidate column of every partition in manifest order, its position is
+    # the global row id. Returns the (name index, trigram index) Arrow tables.
+    names = pl.DataFrame({'raw': candidates}).with_row_count('row').groupby('raw').agg(pl.col('row'))
+    names = names.with_columns(pl.col('raw').apply(fold_name, return_dtype=pl.Utf8).alias('name')
+                ).filter(pl.col('name') != ''
+                ).groupby('name').agg(pl.col('row').flatten().sort()).sort('name')
+
+    name_codes = [trigram_codes(name) for name in names.get_column('name')]
+    name_rows = names.get_column('row')
+
+    # postings: name ids of every trigram code, as one CSR (offsets, values) pair
+    name_ids = np.repeat(np.arange(len(name_codes), dtype=np.uint32), [len(codes) for codes in name_codes])
+    codes = np.concatenate(name_codes)
+    order = np.argsort(codes, kind='stable')
+    posting_offsets = np.searchsorted(codes[order], np.arange(TRIGRAM_CODES + 1))
+
+    row_offsets = np.concatenate([[0], np.cumsum(name_rows.arr.lengths().to_numpy())])
+
+    name_index = pa.table({
+        'name': names.get_column('name').to_arrow(),
+        'trigrams': pa.array([len(codes) for codes in name_codes], pa.uint16()),
+        'rows': _list_array(row_offsets, name_rows.explode().to_numpy().astype(np.uint32), pa.uint32()),
+    })
+    trigram_index = pa.table({'names': _list_array(posting_offsets, name_ids[order], pa.uint32())})
+
+    return name_index, trigram_index
+
+
+def write_arrow_table(table: pa.Table, path) -> None:
+    with pa.OSFile(str(path), 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+############################## NAME INDEX BUILD DONE ##############################
+
+
+
+
+############################## NAME INDEX ##############################
+
+def _read_arrow_table(path) -> pa.Table:
+    # memory mapped, the buffers are read on first use only
+    return pa.ipc.open_file(pa.memory_map(str(path))).read_all().combine_chunks()
+
+
+def _view(array: pa.Array) -> np.ndarray:
+    # numpy view of a primitive array without nulls, Array.to_numpy() would import pandas
+    dtype = np.dtype(array.type.to_pandas_dtype())
+    return np.frombuffer(array.buffers()[1], dtype=dtype, count=len(array), offset=array.offset * dtype.itemsize)
+
+
+def _csr(column: pa.ChunkedArray):
+    # (offsets, values) numpy views of a list column
+    array = column.chunk(0)
+    return _view(array.offsets), _view(array.values)
+
+
+class NameIndex:
+
+    def __init__(self, name_index_file, trigram_index_file):
+        names = _read_arrow_table(name_index_file)
+        self.names = names.column('name')
+        self.name_trigrams = _view(names.column('trigrams').chunk(0))
+        self.row_offsets, self.rows = _csr(names.column('rows'))
+        self.posting_offsets, self.postings = _csr(_read_arrow_table(trigram_index_file).column('names'))
+
+    def search(self, query, limit=20, min_score=MIN_SCORE):
+        # (name ids, scores) of the best matching names, best first
+        folded = fold_name(query)
+        if not folded:
+            return np.empty(0, np.int64), np.empty(0)
+
+        codes = trigram_codes(folded, complete=False)
+        starts, ends = self.posting_offsets[codes], self.posting_offsets[codes + 1]
+        postings = np.concatenate([self.postings[start:end] for start, end in zip(starts, ends)])
+
+        # share of the query trigrams found in each name, names with fewer trigrams of their
+        # own (closer to the query) first among equal shares
+        shared = np.bincount(postings, minlength=len(self.name_trigrams))
+        score = shared / len(codes)
+        matches = np.flatnonzero(score >= min_score)
+        order = np.lexsort((self.name_trigrams[matches], -score[matches]))[:limit]
+
+        return matches[order], score[matches[order]]
+
+    def name(self, name_id) -> str:
+        return self.names[int(name_id)].as_py()
+
+    def name_rows(self, name_ids) -> list:
+        # global row ids of each name
+        return [self.rows[self.row_offsets[i]:self.row_offsets[i + 1]] for i in name_ids]
+
+############################## NAME INDEX DONE ##############################
@@ -0,0 +1,176 @@
+import math
+
+import numpy as np
+import plotly.graph_objects as go
+import polars as pl
+from plotly.colors import qualitative
+
+
+############################## PLOT TRACES ##############################
+
+# The part of plotly express the dashboard uses (bar and scatter charts coloured and
+# faceted by a column, hover names and extra hover columns, axis labels, error bars and
+# marker sizes) built straight from graph_objects traces. plotly express turns every frame
+# into a pandas DataFrame and imports pandas (and IPython) on startup, here every trace
+# gets its columns as numpy views of the polars buffers:
+#
+#   bar(df, x='Criminal_Case', y='Party', color='Party', orientation='h', hover_name='Party',
+#       labels={'Criminal_Case': 'Total Criminal Cases'}, title='...')
+#
+# Traces, colours, legend groups, facet titles and hover text follow plotly express, so the
+# charts look the same.
+
+COLORS = qualitative.Plotly
+
+# marker area of the largest value of a size column, like px.scatter(size_max=20)
+SIZE_MAX = 20
+
+
+def plot_column(df: pl.DataFrame, name) -> np.ndarray:
+    # numeric columns without nulls are read only views, not copies. polars converts through
+    # pyarrow by default, which imports pandas.
+    column = df.get_column(name)
+    if column.dtype == pl.Categorical:
+        column = column.cast(pl.Utf8)
+
+    return column.to_numpy(use_pyarrow=False)
+
+
+def _ordered_values(df: pl.DataFrame, name, category_orders) -> list:
+    # values of a colour or facet column, category_orders first, then in order of appearance
+    values = df.get_column(name).unique(maintain_order=True).to_list()
+    order = [value for value in category_orders.get(name, []) if value in values]
+
+    return order + [value for value in values if value not in order]
+
+
+def _hover_columns(hover_data) -> dict:
+    # column -> d3 format ('' for none), from a list or px's {column: True / False / format}
+    if not hover_data:
+        return {}
+    if isinstance(hover_data, dict):
+        return {name: ('' if fmt is True else fmt) for name, fmt in hover_data.items() if fmt is not False}
+
+    return dict.fromkeys(hover_data, '')
+
+
+def customdata_columns(df: pl.DataFrame, columns) -> np.ndarray:
+    # (rows, columns) of the extra hover columns, object only when one of them is text
+    arrays = [plot_column(df, name) for name in columns]
+    if all(array.dtype.kind in 'biuf' for array in arrays):
+        return np.column_stack(arrays)
+
+    customdata = np.empty((df.height, len(arrays)), dtype=object)
+    for i, array in enumerate(arrays):
+        customdata[:, i] = array
+
+    return customdata
+
+
+def _figure(df: pl.DataFrame, make_trace, x, y, color=None, facet_col=None, facet_col_wrap=0,
+            hover_name=None, hover_data=None, labels=None, category_orders=None, title=None) -> go.Figure:
+    # one trace per (colour, facet) value, make_trace(part, **trace) adds the chart type
+    labels, category_orders = labels or {}, category_orders or {}
+
+    def label(name):
+        return labels.get(name, name)
+
+    colors = _ordered_values(df, color, category_orders) if color else [None]
+    facets = _ordered_values(df, facet_col, category_orders) if facet_col else [None]
+
+    keys = list(dict.fromkeys(name for name in [color, facet_col] if name))
+    parts = df.partition_by(keys, maintain_order=True, as_dict=True) if keys else {(): df}
+    if len(keys) == 1:
+        parts = {(value,): part for value, part in parts.items()}
+
+    hover_columns = _hover_columns(hover_data)
+    # columns already on the chart are not repeated on hover
+    extra = [name for name in hover_columns if name not in (x, y, color, facet_col)]
+
+    # px style hover: hover name, the facet and colour values, x, y and the extra columns
+    header = '<b>%{hovertext}</b><br><br>' if hover_name else ''
+    fields = [(label(name), f'%{{{axis}}}') for name, axis in [(x, 'x'), (y, 'y')] if name not in (color, facet_col)]
+    fields += [(label(name), f'%{{customdata[{i}]{hover_columns[name]}}}') for i, name in enumerate(extra)]
+
+    traces, rows, cols = [], [], []
+    wrap = facet_col_wrap or len(facets)
+
+    for i, color_value in enumerate(colors):
+        shown = False
+        for j, facet_value in enumerate(facets):
+            key = {color: color_value, facet_col: facet_value}
+            if color == facet_col and color_value != facet_value:
+                continue
+
+            part = parts.get(tuple(key[name] for name in keys))
+            if part is None:
+                continue
+
+            values = [(label(facet_col), facet_value)] if facet_col else []
+            values += [(label(color), color_value)] if color else []
+
+            traces.append(make_trace(
+                        part,
+                        name='' if color is None else str(color_value),
+                        legendgroup='' if color is None else str(color_value),
+                        showlegend=color is not None and not shown,
+                        marker=dict(color=COLORS[i % len(COLORS)]),
+                        x=plot_column(part, x), y=plot_column(part, y),
+                        hovertext=plot_column(part, hover_name) if hover_name else None,
+                        customdata=customdata_columns(part, extra) if extra else None,
+                        hovertemplate=header + '<br>'.join(f'{name}={value}' for name, value in values + fields)
+                                      + '<extra></extra>'))
+            rows.append(j // wrap + 1)
+            cols.append(j % wrap + 1)
+            shown = True
+
+    if facet_col:
+        # only faceted charts need it, about as slow to import as the rest of the module
+        from plotly.subplots import make_subplots
+
+        fig = make_subplots(rows=math.ceil(len(facets) / wrap), cols=wrap,
+                            shared_xaxes='all', shared_yaxes='all',
+                            horizontal_spacing=0.03, vertical_spacing=0.07,
+                            subplot_titles=[f'{label(facet_col)}={value}' for value in facets],
+                            x_title=label(x), y_title=label(y))
+        fig.add_traces(traces, rows=rows, cols=cols)
+    else:
+        fig = go.Figure(traces)
+        fig.update_layout(xaxis_title_text=label(x), yaxis_title_text=label(y))
+
+    return fig.update_layout(title_text=title, legend_title_text=label(color) if color else None,
+                             legend_tracegroupgap=0)
+
+
+def bar(df: pl.DataFrame, x, y, color=None, orientation='v', barmode='relative',
+        error_x=None, error_x_minus=None, **figure) -> go.Figure:
+    # px.bar
+    def make_trace(part, **trace):
+        if error_x:
+            trace['error_x'] = dict(type='data', symmetric=False, array=plot_column(part, error_x),
+                                    arrayminus=plot_column(part, error_x_minus) if error_x_minus else None)
+
+        return go.Bar(orientation=orientation, **trace)
+
+    return _figure(df, make_trace, x, y, color, **figure).update_layout(barmode=barmode)
+
+
+def scatter(df: pl.DataFrame, x, y, color=None, size=None, opacity=None, render_mode='svg',
+            **figure) -> go.Figure:
+    # px.scatter, markers only, render_mode 'webgl' draws Scattergl traces
+    sizeref = None
+    if size:
+        # areas scaled so the largest value gets SIZE_MAX
+        sizeref = 2.0 * (df.get_column(size).max() or 1) / SIZE_MAX ** 2
+
+    def make_trace(part, marker, **trace):
+        marker.update(opacity=opacity, symbol='circle')
+        if size:
+            marker.update(size=plot_column(part, size), sizemode='area', sizeref=sizeref)
+
+        trace_type = go.Scattergl if render_mode == 'webgl' else go.Scatter
+        return trace_type(mode='markers', marker=marker, **trace)
+
+    return _figure(df, make_trace, x, y, color, **figure)
+
+############################## PLOT TRACES DONE ##############################
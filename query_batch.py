@@ -0,0 +1,53 @@
+import polars as pl
+
+from instrumentation import span, record_plan
+
+
+############### Query Batch ###############
+
+# Collects every chart query of a rerun and runs them in one pl.collect_all call.
+# Queries with an identical logical plan are only executed once, and subplans
+# marked with .cache() (e.g. the State/Year slice) are shared through polars'
+# common subplan elimination instead of being scanned again for each chart.
+
+class QueryBatch:
+
+    def __init__(self):
+        self._names = {}      # query name -> plan key
+        self._queries = {}    # plan key -> LazyFrame
+        self._frames = None
+
+    def add(self, name, lf: pl.LazyFrame) -> str:
+        if self._frames is not None:
+            raise RuntimeError(f"Query batch already collected, can not add '{name}'")
+
+        plan = lf.explain(optimized=False)
+        self._queries.setdefault(plan, lf)
+        self._names[name] = plan
+
+        return name
+
+    def collect(self) -> dict:
+        if self._frames is None:
+            plans = list(self._queries)
+            # one plan per distinct query, named after the first chart that registered it
+            first_names = {}
+            for name, plan in self._names.items():
+                first_names.setdefault(plan, name)
+            for plan, name in first_names.items():
+                record_plan(name, self._queries[plan])
+
+            with span('collect.query_batch', queries=len(plans)):
+                results = pl.collect_all([self._queries[plan] for plan in plans],
+                                         common_subplan_elimination=True)
+            self._frames = dict(zip(plans, results))
+
+        return {name: self._frames[plan] for name, plan in self._names.items()}
+
+    def __getitem__(self, name) -> pl.DataFrame:
+        return self.collect()[name]
+
+    def __len__(self):
+        return len(self._queries)
+
+############### Query Batch Ends ###############
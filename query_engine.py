@@ -0,0 +1,452 @@
+import threading
+
+import polars as pl
+
+from aggregates import rollup_party_cube, top_parties
+from dataset import (manifest_stamp, read_manifest, read_party_cube, read_constituency_index, read_trends,
+                     read_partition_rows, read_rows, NAME_INDEX_FILE, TRIGRAM_INDEX_FILE,
+                     list_states, list_years, state_version, select_partitions, scan_dataset, scan_selection)
+from instrumentation import span, record_plan
+from name_search import NameIndex
+from query_batch import QueryBatch
+from stats_engine import case_histogram_query, mean_cases_intervals
+
+
+############################## QUERY ENGINE ##############################
+
+# All data logic of the dashboard behind a small, stable API. Every query takes the
+# selection as (State, Years) and returns a polars frame, no streamlit involved, so the
+# same numbers serve the streamlit page, the figure bundles, the benchmark and any
+# headless consumer.
+#
+#   import query_engine as qe
+#   qe.party_summary('Delhi', [2025])
+#   qe.major_parties('Delhi', [2025], n=6)
+#
+# Each public query has a lazy twin (*_query) so selection_frames() can batch them
+# into one collect for a full page.
+
+
+class Dataset:
+
+    def __init__(self, manifest, party_cube: pl.DataFrame, constituency_index: pl.DataFrame,
+                 trends, name_index: NameIndex, stamp=None):
+        self.manifest = manifest
+        self.party_cube = party_cube
+        self.constituency_index = constituency_index
+        self.party_trends, self.constituency_trends = trends
+        self.name_index = name_index
+        self.version = manifest['version']
+        self.stamp = stamp
+
+
+_dataset = None
+_dataset_lock = threading.Lock()
+
+
+def get_dataset() -> Dataset:
+    # loaded once per process and shared by every session/request, reloaded when a
+    # build or append swapped in a new manifest (one stat() per call, no restart needed)
+    global _dataset
+    if _dataset is None or _dataset.stamp != manifest_stamp():
+        with _dataset_lock:
+            if _dataset is None or _dataset.stamp != manifest_stamp():
+                manifest = read_manifest()
+                _dataset = Dataset(manifest, read_party_cube(), read_constituency_index(),
+                                   read_trends(), NameIndex(NAME_INDEX_FILE, TRIGRAM_INDEX_FILE),
+                                   manifest_stamp())
+
+    return _dataset
+
+
+def states() -> list:
+    return list_states(get_dataset().manifest)
+
+
+def years(State) -> list:
+    return list_years(get_dataset().manifest, State)
+
+
+def version(State=None) -> str:
+    # what cached results of a State (or of the whole dataset) are keyed on
+    dataset = get_dataset()
+    if State is None:
+        return dataset.version
+
+    return state_version(dataset.manifest, State)
+
+
+def scan(State=None, Years=None) -> pl.LazyFrame:
+    # candidate rows of the matching partitions only
+    manifest = get_dataset().manifest
+    if State is None:
+        return scan_dataset(manifest)
+
+    return scan_selection(State, Years, manifest)
+
+
+def _party_codes(parties) -> pl.Series:
+    # the party list is encoded once so filters compare categorical codes
+    return pl.Series(list(parties), dtype=pl.Categorical)
+
+############################## QUERY ENGINE DONE ##############################
+
+
+
+
+############################## PARTY QUERIES ##############################
+
+def party_summary_query(State, Years) -> pl.LazyFrame:
+    # Party, candidates_count, total_criminal_cases, money sums, case buckets, avg_cases
+    return rollup_party_cube(get_dataset().party_cube.lazy(), State, Years)
+
+
+def party_summary(State, Years) -> pl.DataFrame:
+    query = party_summary_query(State, Years)
+    record_plan('party_summary', query)
+
+    with span('collect.party_summary'):
+        return query.collect()
+
+
+def major_parties(State, Years, n=6, summary: pl.DataFrame = None) -> pl.DataFrame:
+    # top n parties by total criminal cases, parties without any case are never "major"
+    summary = party_summary(State, Years) if summary is None else summary
+    return summary.filter(pl.col('Party').is_in(top_parties(summary, n=n)))
+
+
+def party_crime_totals(summary: pl.DataFrame) -> pl.DataFrame:
+    return summary.select([pl.col('Party'),
+                           pl.col('total_criminal_cases').alias('Criminal_Case')])
+
+
+def asset_by_year(State, n=18) -> pl.DataFrame:
+    # all years of the state, not only the selected ones, Total_Assets in crore
+    return get_dataset().party_cube.filter(pl.col('State') == State).groupby(['Party','Year']
+                                        ).agg(pl.col('Total_Assets_Cr').sum().alias('Total_Assets')
+                                        ).sort(by='Total_Assets',descending=True
+                                        ).head(n)
+
+############################## PARTY QUERIES DONE ##############################
+
+
+
+
+############################## CANDIDATE QUERIES ##############################
+
+# The lazy twins take the candidate rows to work on, so a full page can share one
+# cached scan of the selection between all of them (see selection_frames).
+
+def party_candidates_query(df_selected: pl.LazyFrame, parties) -> pl.LazyFrame:
+    return df_selected.filter(pl.col('Party').is_in(_party_codes(parties)))
+
+
+def cases_count_query(candidates: pl.LazyFrame, min_cases=3) -> pl.LazyFrame:
+    # number of candidates per (Party, Criminal_Case), for candidates with more than min_cases
+    return candidates.filter(pl.col('Criminal_Case') > min_cases).sort(
+                                            by='Criminal_Case', descending=True
+                                            ).groupby(
+                                            ['Party','Criminal_Case'], maintain_order=True).count()
+
+
+def education_scatter_query(candidates: pl.LazyFrame) -> pl.LazyFrame:
+    return candidates.filter(pl.col('Criminal_Case') > 0)
+
+
+def constituency_breakdown_query(candidates: pl.LazyFrame) -> pl.LazyFrame:
+    return candidates.groupby(['Constituency','Party']
+                                ).agg(pl.col('Criminal_Case').sum()
+                                ).sort(by='Criminal_Case',descending=True)
+
+
+# Point charts get a thinned copy of the candidate rows: the top candidates of every party
+# by each value column are always kept exactly, the dense region is binned and one row per
+# bin is sent, with the number of candidates it stands for in `points`. A pseudo random
+# (hash) sample caps what is left at max_points.
+
+MAX_POINTS = 2000
+OUTLIERS_PER_PARTY = 15
+
+
+def log_bin(column, width) -> pl.Expr:
+    # money spans many orders of magnitude, bins of equal width on a log scale
+    return ((pl.col(column) + 1).log10() / width).floor().alias(f'{column}_bin')
+
+
+def hash_bin(n) -> pl.Expr:
+    # splits a bin into n random slices, i.e. keeps up to n rows of it
+    return (pl.col('Candidate').hash(1) % n).alias('hash_bin')
+
+
+def thin_points_query(candidates: pl.LazyFrame, bins, keep_top, max_points=MAX_POINTS) -> pl.LazyFrame:
+    outlier = pl.lit(False)
+    for column in keep_top:
+        outlier = outlier | (pl.col(column).rank('ordinal', descending=True).over('Party') <= OUTLIERS_PER_PARTY)
+
+    # outliers are binned apart from the rest, so each one stands for itself only
+    bins = [pl.col('Party'), pl.col('outlier')] + bins
+
+    return candidates.with_columns(outlier.alias('outlier')
+                            ).with_columns([
+                                pl.col('Party').cumcount().over(bins).alias('bin_rank'),
+                                pl.col('Party').count().over(bins).alias('points'),
+                            ]).filter(pl.col('outlier') | (pl.col('bin_rank') == 0)
+                            ).with_columns(
+                                pl.when(pl.col('outlier')).then(pl.lit(1, pl.UInt32)).otherwise(pl.col('points')).alias('points')
+                            ).sort(by=pl.when(pl.col('outlier')).then(pl.lit(0, pl.UInt64)
+                                        ).otherwise(pl.col('Candidate').hash(0))
+                            ).head(max_points
+                            ).drop(['outlier', 'bin_rank'])
+
+
+def box_stats_query(candidates: pl.LazyFrame, column='Criminal_Case') -> pl.LazyFrame:
+    # what plotly would compute from every point, precomputed per party
+    q1 = pl.col(column).quantile(0.25, 'linear')
+    q3 = pl.col(column).quantile(0.75, 'linear')
+
+    return candidates.groupby('Party', maintain_order=True).agg([
+                            q1.alias('q1'),
+                            pl.col(column).median().alias('median'),
+                            q3.alias('q3'),
+                            pl.col(column).mean().alias('mean'),
+                            pl.col(column).filter(pl.col(column) >= q1 - 1.5 * (q3 - q1)).min().alias('lowerfence'),
+                            pl.col(column).filter(pl.col(column) <= q3 + 1.5 * (q3 - q1)).max().alias('upperfence'),
+                            pl.count().alias('candidates'),
+                        ])
+
+
+def party_candidates(State, Years, parties) -> pl.DataFrame:
+    return party_candidates_query(scan(State, Years), parties).collect()
+
+
+def cases_count(State, Years, parties, min_cases=3) -> pl.DataFrame:
+    return cases_count_query(party_candidates_query(scan(State, Years), parties), min_cases).collect()
+
+
+def education_scatter(State, Years, parties) -> pl.DataFrame:
+    return education_scatter_query(party_candidates_query(scan(State, Years), parties)).collect()
+
+
+def constituency_breakdown(State, Years, parties=None) -> pl.DataFrame:
+    candidates = scan(State, Years)
+    if parties is not None:
+        candidates = party_candidates_query(candidates, parties)
+
+    return constituency_breakdown_query(candidates).collect()
+
+############################## CANDIDATE QUERIES DONE ##############################
+
+
+
+
+############################## CONSTITUENCY DRILL-DOWN ##############################
+
+# Served from the constituency index (see aggregates.build_constituency_index): totals are
+# a filter of the small index frame and the candidates of a constituency are one row range
+# of each selected partition, no scan of the State.
+
+DRILL_DOWN_COLUMNS = ['Year', 'Candidate', 'Party', 'Criminal_Case', 'Total_Assets',
+                      'Liabilities', 'Education']
+
+
+def constituency_totals(State, Years) -> pl.DataFrame:
+    # Constituency, candidates_count, total_criminal_cases, Total_Assets over the selected years
+    return get_dataset().constituency_index.filter(
+                (pl.col('State') == State) & (pl.col('Year').is_in(Years))
+            ).groupby('Constituency').agg([
+                pl.col('length').sum().alias('candidates_count'),
+                pl.col('total_criminal_cases').sum(),
+                pl.col('Total_Assets').sum(),
+            ]).sort(by=['total_criminal_cases', 'Constituency'], descending=[True, False])
+
+
+def constituency_candidates(State, Years, Constituency) -> pl.DataFrame:
+    dataset = get_dataset()
+    ranges = dataset.constituency_index.filter(
+                (pl.col('State') == State) & (pl.col('Year').is_in(Years)) &
+                (pl.col('Constituency') == Constituency))
+
+    parts = []
+    for Year, offset, length in ranges.select(['Year', 'offset', 'length']).iter_rows():
+        partition = select_partitions(dataset.manifest, State, [Year])[0]
+        with span('slice.constituency', Year=Year):
+            parts.append(read_partition_rows(partition, offset, length).select(DRILL_DOWN_COLUMNS))
+
+    if not parts:
+        return scan(State, Years).select(DRILL_DOWN_COLUMNS).head(0).collect()
+
+    return pl.concat(parts).sort(by=['Criminal_Case', 'Year'], descending=[True, True])
+
+############################## CONSTITUENCY DRILL-DOWN DONE ##############################
+
+
+
+
+############################## TREND QUERIES ##############################
+
+# Year over year change of parties and constituencies, served from the trend rollups
+# (see aggregates.build_trends): a row of Year compares it with prev_Year, the previous
+# election of the State, for candidates_count, total_criminal_cases and Total_Assets
+# (prev_* and *_delta columns). The first election of a State has no rows.
+
+def _trend_rows(trends: pl.DataFrame, State, Years=None) -> pl.DataFrame:
+    selected = pl.col('State') == State
+    if Years is not None:
+        selected = selected & pl.col('Year').is_in(Years)
+
+    return trends.filter(selected)
+
+
+def party_trends(State, Years=None) -> pl.DataFrame:
+    return _trend_rows(get_dataset().party_trends, State, Years)
+
+
+def constituency_trends(State, Years=None) -> pl.DataFrame:
+    return _trend_rows(get_dataset().constituency_trends, State, Years)
+
+
+def trend_year(State, Years):
+    # latest of Years with an earlier election of the State to compare with, None when the
+    # selection only holds the State's first election (or nothing)
+    first = min(years(State), default=None)
+    return max((Year for Year in Years if first is not None and Year > first), default=None)
+
+
+def fastest_rising_parties(State, Year, n=10, measure='total_criminal_cases') -> pl.DataFrame:
+    # parties with the largest increase of measure at the Year election of the State
+    delta = f'{measure}_delta'
+    return party_trends(State, [] if Year is None else [Year]).filter(pl.col(delta) > 0
+                                    ).with_columns(pl.col('Party').cast(pl.Utf8)
+                                    ).sort(by=[delta, 'Party'], descending=[True, False]
+                                    ).head(n)
+
+############################## TREND QUERIES DONE ##############################
+
+
+
+
+############################## REPEAT CANDIDATES ##############################
+
+# Politicians who stood in more than one election of a State, followed by the person_id
+# data_build gives every candidate row (see entity_resolution): their criminal cases and
+# assets at the first and the latest election. All years of the State, not only the
+# selected ones.
+
+def repeat_candidates_query(candidates: pl.LazyFrame, min_elections=2) -> pl.LazyFrame:
+    # one row per person, latest Candidate/Party/Constituency, Total_Assets in crore
+    return candidates.sort('Year').groupby('person_id').agg([
+                pl.col(['Candidate', 'Party', 'Constituency']).last(),
+                pl.col('Year').n_unique().alias('elections'),
+                pl.col('Year').first().alias('first_Year'),
+                pl.col('Year').last().alias('last_Year'),
+                pl.col('Criminal_Case').first().alias('first_cases'),
+                pl.col('Criminal_Case').last().alias('last_cases'),
+                pl.col('Year').filter(pl.col('Criminal_Case') > 0).n_unique().alias('elections_with_cases'),
+                pl.col('Total_Assets_Cr').first().alias('first_assets'),
+                pl.col('Total_Assets_Cr').last().alias('last_assets'),
+            ]).filter(pl.col('elections') >= min_elections
+            ).with_columns((pl.col('last_assets') - pl.col('first_assets')).alias('asset_growth')
+            ).sort(by=['last_cases', 'person_id'], descending=[True, False])
+
+
+def repeat_candidates(State, min_elections=2) -> pl.DataFrame:
+    return repeat_candidates_query(scan(State), min_elections).collect()
+
+############################## REPEAT CANDIDATES DONE ##############################
+
+
+
+
+############################## CANDIDATE SEARCH ##############################
+
+# Candidates of every State and year by name, from the trigram index of name_search: the
+# index answers with global row ids, the rows are gathered from the memory mapped
+# partitions, nothing is scanned.
+
+SEARCH_COLUMNS = ['Candidate', 'State', 'Year', 'Constituency', 'Party', 'Criminal_Case',
+                  'Total_Assets', 'Education']
+
+
+def search_row_ids(query, limit=20) -> pl.DataFrame:
+    # row_id and score of every row of the best matching names, best names first
+    name_index = get_dataset().name_index
+    name_ids, scores = name_index.search(query, limit=limit)
+
+    rows = name_index.name_rows(name_ids)
+    return pl.DataFrame({
+        'row_id': pl.Series([row_id for name_rows in rows for row_id in name_rows], dtype=pl.UInt32),
+        'score': pl.Series([score for score, name_rows in zip(scores, rows) for _ in name_rows], dtype=pl.Float64),
+    })
+
+
+def search_candidates(query, limit=20, max_rows=200) -> pl.DataFrame:
+    with span('search.candidates'):
+        matches = search_row_ids(query, limit=limit).head(max_rows)
+        rows = read_rows(get_dataset().manifest, matches.get_column('row_id').to_list())
+
+    return pl.concat([rows.select(SEARCH_COLUMNS), matches], how='horizontal')
+
+############################## CANDIDATE SEARCH DONE ##############################
+
+
+
+
+############################## SELECTION FRAMES ##############################
+
+# Every frame the dashboard plots for one (State, Years) selection. Party level frames
+# are rolled up from the party cube, candidate level chart queries are registered in one
+# QueryBatch and collected together in one pass over the selected partitions.
+
+def selection_frames(State_Selected, Year_Selected) -> dict:
+
+    cases_agg = party_summary(State_Selected, Year_Selected)
+
+    Major_Parties = major_parties(State_Selected, Year_Selected, n=6, summary=cases_agg
+                                  ).get_column('Party').to_list()
+
+    # one .cache()d scan of the selected partitions shared by every chart query below
+    df_selected = scan(State_Selected, Year_Selected).cache()
+    major_party_rows = party_candidates_query(df_selected, Major_Parties).cache()
+
+    chart_queries = QueryBatch()
+
+    # point charts are thinned server side, the box itself is drawn from exact quartiles
+    chart_queries.add('box_stats', box_stats_query(major_party_rows))
+    chart_queries.add('box_plot', thin_points_query(major_party_rows, [pl.col('Criminal_Case'), hash_bin(40)],
+                                                    keep_top=['Criminal_Case']))
+    chart_queries.add('asset_scatter', thin_points_query(major_party_rows, [log_bin('Total_Assets', 0.02)],
+                                                         keep_top=['Total_Assets']))
+    chart_queries.add('crime_asset_bubble', thin_points_query(major_party_rows,
+                                                              [pl.col('Criminal_Case'), log_bin('Total_Assets', 0.05)],
+                                                              keep_top=['Criminal_Case', 'Total_Assets']))
+
+    chart_queries.add('cases_count_facet', cases_count_query(major_party_rows, min_cases=3))
+
+    # identical plans, both education facets run the query once
+    chart_queries.add('edu_party_facet', education_scatter_query(major_party_rows))
+    chart_queries.add('edu_education_facet', education_scatter_query(major_party_rows))
+
+    chart_queries.add('const_crime_sum', constituency_breakdown_query(major_party_rows))
+    chart_queries.add('const_crime_sum_all', constituency_breakdown_query(df_selected))
+
+    chart_queries.add('repeat_candidates', repeat_candidates_query(scan(State_Selected)))
+
+    # every party, for the confidence intervals of avg_cases
+    chart_queries.add('case_histogram', case_histogram_query(df_selected))
+
+    frames = chart_queries.collect()
+
+    with span('stats.intervals'):
+        intervals = mean_cases_intervals(frames.pop('case_histogram'))
+
+    # avg_cases_low, avg_cases_high next to avg_cases
+    frames['cases_agg'] = cases_agg.join(intervals, on='Party', how='left')
+    frames['highest_criminal_parties'] = party_crime_totals(cases_agg)
+    frames['party_asset_sum'] = asset_by_year(State_Selected)
+    # latest selected election against the one before it, no rows when there is none before it
+    frames['trend_year'] = trend_year(State_Selected, Year_Selected)
+    frames['rising_parties'] = fastest_rising_parties(State_Selected, frames['trend_year'])
+
+    return frames
+
+############################## SELECTION FRAMES DONE ##############################
@@ -0,0 +1,247 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+import polars as pl
+
+
+############### Result Cache ###############
+
+# Bounded, process wide LRU cache for the results of one (State, Years) selection, its
+# serialized plotly figures. Shared by every session of the process, so a view someone
+# else already asked for is a lookup.
+# Entries are evicted least recently used first once their summed size passes max_bytes.
+
+
+def estimate_size(value) -> int:
+    if isinstance(value, (pl.DataFrame, pl.Series)):
+        return value.estimated_size()
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(v) for v in value)
+
+    return sys.getsizeof(value)
+
+
+def selection_key(State_Selected, Year_Selected, *extra) -> tuple:
+    # the same view regardless of the order the years were picked in
+    return (State_Selected, tuple(sorted(set(Year_Selected)))) + extra
+
+
+class ResultCache:
+
+    def __init__(self, max_bytes=256 * 2**20, max_entries=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+        self._entries = OrderedDict()   # key -> (value, size)
+        self._lock = threading.Lock()
+
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size=None) -> None:
+        size = estimate_size(value) if size is None else size
+
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+
+            # a single result larger than the whole budget is not kept at all
+            if size > self.max_bytes:
+                return
+
+            self._entries[key] = (value, size)
+            self.nbytes += size
+            self._evict()
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            # computed outside the lock, concurrent misses for one key may both compute
+            value = compute()
+            self.put(key, value)
+
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def _evict(self) -> None:
+        while self._entries and (self.nbytes > self.max_bytes or
+                                 (self.max_entries is not None and len(self._entries) > self.max_entries)):
+            _, (_, size) = self._entries.popitem(last=False)
+            self.nbytes -= size
+            self.evictions += 1
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.nbytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+############### Result Cache Ends ###############
+
+
+
+
+############### Disk Cache ###############
+
+# Second tier below ResultCache, shared by every process on the machine: one directory
+# per key holding the frames of the result as uncompressed Arrow IPC files (memory mapped
+# on load, like the dataset) and everything else as json. Entries are written aside and
+# renamed into place, the least recently used ones are removed once max_bytes is passed.
+#
+#   data/result_cache/<sha1 of key>/entry.json
+#   data/result_cache/<sha1 of key>/<n>.arrow
+
+
+class DiskCache:
+
+    def __init__(self, root: Path, max_bytes=1 * 2**30):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key) -> Path:
+        # keys are tuples of strings and numbers, their repr is the same in every process
+        return self.root / hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            with open(path / 'entry.json') as f:
+                entry = json.load(f)
+            value = self._load(entry['value'], path)
+            os.utime(path)
+        except (OSError, ValueError):
+            # missing, or removed by another process while reading
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return value
+
+    def put(self, key, value) -> None:
+        path = self._path(key)
+        tmp_path = self.root / f'.{path.name}.{uuid.uuid4().hex}'
+        tmp_path.mkdir(parents=True)
+
+        frames = []
+        entry = {'key': repr(key), 'value': self._dump(value, tmp_path, frames)}
+        with open(tmp_path / 'entry.json', 'w') as f:
+            json.dump(entry, f)
+
+        try:
+            tmp_path.rename(path)
+        except OSError:
+            # another process stored the same key first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+        self._evict()
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+
+        return value
+
+    def _dump(self, value, path, frames):
+        if isinstance(value, pl.DataFrame):
+            name = f'{len(frames)}.arrow'
+            value.write_ipc(path / name, compression='uncompressed')
+            frames.append(name)
+            return {'__frame__': name}
+        if isinstance(value, dict):
+            return {k: self._dump(v, path, frames) for k, v in value.items()}
+
+        return value
+
+    def _load(self, value, path):
+        if isinstance(value, dict):
+            if '__frame__' in value:
+                return pl.read_ipc(path / value['__frame__'], memory_map=True, rechunk=False)
+            return {k: self._load(v, path) for k, v in value.items()}
+
+        return value
+
+    def _entries(self) -> list:
+        # (last used, size, path) of every complete entry
+        entries = []
+        for path in self.root.iterdir():
+            if path.name.startswith('.'):
+                continue
+            try:
+                size = sum(f.stat().st_size for f in path.iterdir())
+                entries.append((path.stat().st_mtime, size, path))
+            except OSError:
+                continue
+
+        return entries
+
+    def _evict(self) -> None:
+        entries = sorted(self._entries())
+        nbytes = sum(size for _, size, _ in entries)
+
+        for _, size, path in entries:
+            if nbytes <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            nbytes -= size
+
+    def stats(self) -> dict:
+        entries = self._entries() if self.root.exists() else []
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+############### Disk Cache Ends ###############
@@ -0,0 +1,163 @@
+from statistics import NormalDist
+
+import numpy as np
+import polars as pl
+
+
+############################## STATS ENGINE ##############################
+
+# Confidence intervals of each party's average criminal cases per candidate, so a party
+# with 2 candidates does not outrank one with 200 on a lucky draw. Every party of the
+# selection is handled at once from its (Party, Criminal_Case) histogram, there is no loop
+# per party. One method per party, by what its candidates allow:
+#
+#   normal    - more than NORMAL_MIN_CANDIDATES candidates: the normal limit of the mean,
+#               mean +- z * sd / sqrt(candidates).
+#   bootstrap - smaller parties: percentile interval of the Poissonized bootstrap, a
+#               resample redraws the candidates of each histogram cell as Poisson(candidates
+#               in the cell), so one (resamples, cells) draw resamples every party and
+#               np.add.reduceat sums the cells of each party.
+#               The Poisson draws are uniform draws looked up in a table of Poisson cdfs
+#               through a guide table (a cell never holds more than NORMAL_MIN_CANDIDATES),
+#               several times faster than Generator.poisson.
+#   poisson   - parties whose candidates all have the same count (a single candidate, or
+#               none with a case) have nothing to resample: the exact interval of a Poisson
+#               rate (Byar's approximation), total cases over candidates.
+#
+# The generator is seeded, the same selection always gets the same intervals (figures are
+# cached and pre-rendered).
+
+RESAMPLES = 1000
+NORMAL_MIN_CANDIDATES = 30
+CONFIDENCE = 0.95
+SEED = 0
+
+
+def _poisson_cdf_table(max_lambda, width):
+    # cdf of Poisson(lam) at k = 0..width-1, one row per lam = 1..max_lambda
+    lam = np.arange(1, max_lambda + 1, dtype=np.float64)[:, None]
+    k = np.arange(width, dtype=np.float64)
+    log_factorial = np.concatenate([[0.0], np.cumsum(np.log(k[1:]))])
+
+    return np.minimum(np.cumsum(np.exp(k * np.log(lam) - lam - log_factorial), axis=1), 1.0)
+
+
+def _guide_table(cdf, steps):
+    # guide[lam row, g] = the draw of a uniform at g / steps, a uniform of the bin is that
+    # or a little more (one more per cdf entry inside the bin)
+    return np.stack([np.searchsorted(row, np.arange(steps) / steps, side='right') for row in cdf])
+
+
+# Poisson(30) is above 80 with probability 3e-14
+POISSON_WIDTH = 80
+GUIDE_STEPS = 1024
+POISSON_CDF = _poisson_cdf_table(NORMAL_MIN_CANDIDATES, POISSON_WIDTH)
+# flattened, with an entry above any uniform closing each row
+POISSON_CDF_FLAT = np.hstack([POISSON_CDF, np.full((NORMAL_MIN_CANDIDATES, 1), 2.0)]).ravel()
+POISSON_GUIDE = _guide_table(POISSON_CDF, GUIDE_STEPS).ravel()
+
+
+def draw_poisson(rng, lam, size) -> np.ndarray:
+    # (size, len(lam)) Poisson draws for integer lam in 1..NORMAL_MIN_CANDIDATES, by inverse
+    # transform: the number of cdf entries of the lam row not above a uniform draw. The
+    # guide table gives it directly for most draws, the rest step up to the next cdf entry.
+    row = lam.astype(np.int64) - 1
+    u = rng.random((size, len(lam)))
+
+    drawn = POISSON_GUIDE[row * GUIDE_STEPS + (u * GUIDE_STEPS).astype(np.int64)]
+    first = row * (POISSON_WIDTH + 1)
+
+    stepping = np.flatnonzero(POISSON_CDF_FLAT[first + drawn] <= u)
+    while stepping.size:
+        i, j = np.unravel_index(stepping, u.shape)
+        drawn[i, j] += 1
+        stepping = stepping[POISSON_CDF_FLAT[first[j] + drawn[i, j]] <= u[i, j]]
+
+    return drawn
+
+
+def case_histogram_query(candidates: pl.LazyFrame) -> pl.LazyFrame:
+    # Party, Criminal_Case, candidates - one row per distinct case count of a party
+    return candidates.groupby(['Party', 'Criminal_Case']).agg(
+                                pl.count().alias('candidates')
+                            ).sort(by=['Party', 'Criminal_Case'])
+
+
+def poisson_intervals(cases, candidates, confidence=CONFIDENCE):
+    # (low, high) of total cases / candidates, Byar's approximation of the exact interval
+    z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+    upper = cases + 1.0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        low = cases * (1 - 1 / (9 * cases) - z / (3 * np.sqrt(cases))) ** 3
+    high = upper * (1 - 1 / (9 * upper) + z / (3 * np.sqrt(upper))) ** 3
+
+    return np.where(cases > 0, low, 0.0) / candidates, high / candidates
+
+
+def bootstrap_intervals(cases, candidates, starts, resamples=RESAMPLES, confidence=CONFIDENCE, seed=SEED):
+    # (low, high) per party of the histogram cells (cases, candidates) sorted by party,
+    # starts = first cell of each party
+    party_candidates = np.add.reduceat(candidates, starts)
+    party_cells = np.diff(np.append(starts, len(cases)))
+    mean = np.add.reduceat(cases * candidates, starts) / party_candidates
+
+    # normal limit: mean +- z * sd / sqrt(n)
+    z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+    party_of_cell = np.repeat(np.arange(len(starts)), party_cells)
+    variance = np.add.reduceat(candidates * (cases - mean[party_of_cell]) ** 2, starts) / party_candidates
+    spread = z * np.sqrt(variance / party_candidates)
+    low, high = mean - spread, mean + spread
+
+    # resampled: small parties with more than one distinct count
+    resampled = (party_candidates <= NORMAL_MIN_CANDIDATES) & (party_cells > 1)
+    cells = resampled[party_of_cell]
+    if cells.any():
+        cell_cases, cell_candidates = cases[cells], candidates[cells]
+        cell_starts = np.flatnonzero(np.diff(np.append(-1, party_of_cell[cells])))
+
+        # (resamples, cells), the cells of a party are summed along contiguous rows
+        drawn = draw_poisson(np.random.default_rng(seed), cell_candidates, resamples)
+        drawn_candidates = np.add.reduceat(drawn, cell_starts, axis=1)
+        drawn_cases = np.add.reduceat(drawn * cell_cases, cell_starts, axis=1)
+
+        # a resample without any candidate of the party keeps its observed mean
+        observed = mean[resampled]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = np.where(drawn_candidates > 0, drawn_cases / drawn_candidates, observed)
+
+        alpha = (1 - confidence) / 2
+        low[resampled], high[resampled] = np.quantile(means, [alpha, 1 - alpha], axis=0)
+
+    # one distinct count, every resample has the same mean
+    single = party_cells == 1
+    low[single], high[single] = mean[single], mean[single]
+
+    return np.maximum(low, 0.0), high
+
+
+def mean_cases_intervals(histogram: pl.DataFrame, confidence=CONFIDENCE) -> pl.DataFrame:
+    # Party, avg_cases_low, avg_cases_high - parties in histogram order
+    if histogram.is_empty():
+        return pl.DataFrame(schema={'Party': histogram.schema['Party'],
+                                    'avg_cases_low': pl.Float64, 'avg_cases_high': pl.Float64})
+
+    # not through pyarrow, which would import pandas
+    cases = histogram.get_column('Criminal_Case').to_numpy(use_pyarrow=False).astype(np.float64)
+    candidates = histogram.get_column('candidates').to_numpy(use_pyarrow=False).astype(np.float64)
+    starts = histogram.get_column('Party').is_first().arg_true().to_numpy(use_pyarrow=False)
+
+    low, high = bootstrap_intervals(cases, candidates, starts, confidence=confidence)
+
+    # the bootstrap interval of a single distinct count has zero width
+    single = np.diff(np.append(starts, len(cases))) == 1
+    low[single], high[single] = poisson_intervals(cases[starts[single]] * candidates[starts[single]],
+                                                  candidates[starts[single]], confidence)
+
+    return pl.DataFrame({
+        'Party': histogram.get_column('Party').take(starts),
+        'avg_cases_low': low,
+        'avg_cases_high': high,
+    })
+
+############################## STATS ENGINE DONE ##############################